@@ -0,0 +1,135 @@
+import threading
+import time
+
+import config
+from ai.context import user_context
+from ai.processors import account_name_tokens
+
+# Minimum trigram similarity for a fuzzy match
+FUZZY_THRESHOLD = 0.4
+# How far ahead the best candidate must be to count as unambiguous
+FUZZY_MARGIN = 0.15
+
+
+class AccountResolutionError(ValueError):
+    """Raised when an account phrase matches no account or more than one"""
+
+    def __init__(self, phrase, candidates):
+        self.phrase = phrase
+        self.candidates = candidates
+        if candidates:
+            names = ', '.join(candidate['account_name'] for candidate in candidates)
+            message = f"Account '{phrase}' is ambiguous, it could be: {names}"
+        else:
+            message = f"No account matches '{phrase}'"
+        super().__init__(message)
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AccountNameIndex:
+    """
+    Per-user in-memory index of account names for resolving LLM tool arguments.
+
+    Each user's accounts are indexed (from the AI context snapshot) as
+    normalised tokens plus character trigrams. Lookups try, in order, an exact
+    token match, a token-subset match and finally trigram similarity, and
+    never touch MySQL while the user's index is fresh. An index expires after
+    the same ttl as the context snapshot it was built from, and is dropped
+    whenever that snapshot is invalidated.
+
+    Args:
+        ttl (int): Seconds before a user's index is rebuilt regardless
+    """
+
+    def __init__(self, ttl=600):
+        self.ttl = ttl
+        self._entries = {}  # user_id -> (built_at, list of index entries)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _entry(account_id, account_name):
+        tokens = account_name_tokens(account_name)
+        return {
+            'account_id': account_id,
+            'account_name': account_name,
+            'tokens': tokens,
+            'trigrams': _trigrams(' '.join(tokens)),
+        }
+
+    def _user_entries(self, user_id):
+        with self._lock:
+            cached = self._entries.get(user_id)
+        if cached is not None and time.monotonic() - cached[0] <= self.ttl:
+            return cached[1]
+
+        accounts = user_context.get_accounts(user_id) or []
+        entries = [self._entry(account['account_id'], account['account_name']) for account in accounts]
+        with self._lock:
+            self._entries[user_id] = (time.monotonic(), entries)
+        return entries
+
+    def invalidate_user(self, user_id):
+        """Forget a user's index so the next lookup rebuilds it"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def lookup(self, user_id, phrase):
+        """Like resolve(), but return None instead of raising when nothing or more than one account matches"""
+        try:
+            return self.resolve(user_id, phrase)
+        except AccountResolutionError:
+            return None
+
+    def resolve(self, user_id, phrase):
+        """
+        Resolve an account phrase to one of the user's accounts.
+
+        Args:
+            user_id (int): Owner of the accounts
+            phrase (str): Account as written by the user or the LLM
+
+        Returns:
+            dict: account_id and account_name of the matching account
+
+        Raises:
+            AccountResolutionError: If no account or more than one account matches
+        """
+        entries = self._user_entries(user_id)
+        wanted = account_name_tokens(phrase or '')
+        if not wanted:
+            raise AccountResolutionError(phrase, [])
+
+        for matches in (
+            [e for e in entries if e['tokens'] == wanted],
+            [e for e in entries if all(token in e['tokens'] for token in wanted)],
+        ):
+            if len(matches) == 1:
+                return self._public(matches[0])
+            if matches:
+                raise AccountResolutionError(phrase, [self._public(e) for e in matches])
+
+        query = _trigrams(' '.join(wanted))
+        scored = sorted(
+            ((len(query & e['trigrams']) / len(query | e['trigrams']), e) for e in entries),
+            key=lambda item: item[0],
+            reverse=True
+        )
+        candidates = [(score, e) for score, e in scored if score >= FUZZY_THRESHOLD]
+        if not candidates:
+            raise AccountResolutionError(phrase, [])
+        best_score = candidates[0][0]
+        close = [e for score, e in candidates if best_score - score < FUZZY_MARGIN]
+        if len(close) > 1:
+            raise AccountResolutionError(phrase, [self._public(e) for e in close])
+        return self._public(close[0])
+
+    @staticmethod
+    def _public(entry):
+        return {'account_id': entry['account_id'], 'account_name': entry['account_name']}
+
+
+account_index = AccountNameIndex(ttl=config.AI_CONTEXT_TTL)
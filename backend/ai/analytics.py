@@ -0,0 +1,170 @@
+import datetime
+import decimal
+
+import numpy as np
+
+import config
+from ai.categorizer import get_matcher
+from database.connection import run_query
+
+
+def load_withdrawals(user_id):
+    """
+    Load a user's completed withdrawals as columns.
+
+    Amounts come back from MySQL as integer cents and dates as a month
+    ordinal, so no per-row Decimal or datetime conversion happens in Python.
+
+    Returns:
+        dict: 'amount_cents' (int64 array), 'month' (int32 array of year * 12 + month - 1)
+            and 'description' (list of str or None)
+    """
+    def fetch(cursor):
+        cursor.execute(
+            """
+            SELECT CAST(ROUND(t.amount * 100) AS SIGNED) AS amount_cents,
+                   YEAR(t.transaction_date) * 12 + MONTH(t.transaction_date) - 1 AS month,
+                   t.description
+            FROM transactions t
+            WHERE t.source_account_id IN (SELECT account_id FROM accounts WHERE user_id = %s)
+              AND t.transaction_type = 'Withdrawal'
+              AND t.status = 'completed'
+            """,
+            (user_id,)
+        )
+        return cursor.fetchall()
+
+    rows = run_query(fetch)
+    return {
+        'amount_cents': np.fromiter((row['amount_cents'] for row in rows), dtype=np.int64, count=len(rows)),
+        'month': np.fromiter((row['month'] for row in rows), dtype=np.int32, count=len(rows)),
+        'description': [row['description'] for row in rows],
+    }
+
+
+def _categorize_column(descriptions, matcher):
+    """Categorise each distinct description once and map the result back to every row"""
+    codes = {}
+    row_codes = np.fromiter(
+        (codes.setdefault(description, len(codes)) for description in descriptions),
+        dtype=np.int64,
+        count=len(descriptions)
+    )
+    categories = [matcher.categorize(description) for description in codes]
+    names = sorted(set(categories))
+    index = {name: i for i, name in enumerate(names)}
+    code_to_category = np.array([index[category] for category in categories], dtype=np.int64)
+    return names, code_to_category[row_codes]
+
+
+def rolling_slopes(series, window):
+    """
+    Least-squares slope of every trailing window along the last axis.
+
+    Args:
+        series (ndarray): Shape (rows, months)
+        window (int): Months per window
+
+    Returns:
+        ndarray: Shape (rows, months - window + 1); column j is the slope of months j .. j + window - 1
+    """
+    windows = np.lib.stride_tricks.sliding_window_view(series, window, axis=1)
+    x = np.arange(window, dtype=np.float64)
+    x -= x.mean()
+    centred = windows - windows.mean(axis=2, keepdims=True)
+    return centred @ x / (x @ x)
+
+
+def _month_label(ordinal):
+    return f"{ordinal // 12:04d}-{ordinal % 12 + 1:02d}"
+
+
+def _money(cents):
+    """Integer cents as an exact decimal string, e.g. 12345 -> '123.45'"""
+    return str(decimal.Decimal(int(round(cents))).scaleb(-2))
+
+
+def spending_summary(columns, category_rules=None, window=None, threshold=None, today=None):
+    """
+    Per-category and per-month spending totals with trend detection.
+
+    Totals are computed in integer cents with a single bincount over
+    (category, month) cells. The months run from the first withdrawal to the
+    current month, with months without spending as zeros, so the trend
+    window always ends now: a category that stopped months ago falls rather
+    than keeping its last slope. A category is trending when the slope of
+    its last `window` months, relative to its average monthly spend in that
+    window, exceeds `threshold`. Amounts and slopes are exact decimal strings.
+
+    Args:
+        columns (dict): Output of load_withdrawals()
+        category_rules (dict, optional): User-defined category -> keywords rules
+        window (int, optional): Months used for the trend slope
+        threshold (float, optional): Relative monthly change that counts as a trend
+        today (datetime.date, optional): Anchors the last month; defaults to today
+
+    Returns:
+        dict: categories, monthly, trends and summary, like analyze_spending_patterns()
+    """
+    window = window or config.AI_TREND_WINDOW_MONTHS
+    threshold = config.AI_TREND_THRESHOLD if threshold is None else threshold
+    amounts = columns['amount_cents']
+
+    if amounts.size == 0:
+        return {
+            "categories": {},
+            "monthly": {"months": [], "totals": {}},
+            "trends": {"increasing": [], "decreasing": [], "slopes": {}},
+            "summary": "No spending transactions found to analyze."
+        }
+
+    names, category_idx = _categorize_column(columns['description'], get_matcher(category_rules))
+    today = today or datetime.date.today()
+    first_month = int(columns['month'].min())
+    last_month = max(today.year * 12 + today.month - 1, int(columns['month'].max()))
+    month_count = last_month - first_month + 1
+    month_idx = columns['month'].astype(np.int64) - first_month
+
+    # One pass over all rows: totals per (category, month) cell
+    cells = np.bincount(
+        category_idx * month_count + month_idx,
+        weights=amounts,
+        minlength=len(names) * month_count
+    ).reshape(len(names), month_count)
+    totals = cells.sum(axis=1)
+
+    order = np.argsort(-totals, kind='stable')
+    categories = {names[i]: _money(totals[i]) for i in order}
+
+    increasing, decreasing, slopes = [], [], {}
+    if month_count >= window:
+        latest = rolling_slopes(cells, window)[:, -1]
+        recent_mean = cells[:, -window:].mean(axis=1)
+        relative = np.divide(latest, recent_mean, out=np.zeros_like(latest), where=recent_mean > 0)
+        for i in order:
+            slopes[names[i]] = _money(latest[i])
+            if relative[i] > threshold:
+                increasing.append(names[i])
+            elif relative[i] < -threshold:
+                decreasing.append(names[i])
+
+    top_category = names[order[0]]
+    summary = f"Your highest spending category is {top_category} at HK${_money(totals[order[0]])}."
+    if increasing:
+        summary += f" Spending is rising in: {', '.join(increasing)}."
+    if decreasing:
+        summary += f" Spending is falling in: {', '.join(decreasing)}."
+
+    return {
+        "categories": categories,
+        "monthly": {
+            "months": [_month_label(first_month + i) for i in range(month_count)],
+            "totals": {names[i]: [_money(cents) for cents in cells[i]] for i in order},
+        },
+        "trends": {
+            "increasing": increasing,
+            "decreasing": decreasing,
+            "slopes": slopes,
+        },
+        "summary": summary
+    }
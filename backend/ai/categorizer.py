@@ -0,0 +1,125 @@
+import re
+from functools import lru_cache
+
+# Default spending categories, in priority order: when a description matches
+# keywords from several categories, the earliest category wins
+DEFAULT_CATEGORY_KEYWORDS = {
+    "food": ["restaurant", "cafe", "grocery", "food", "meal", "dining"],
+    "transport": ["transport", "uber", "taxi", "bus", "mtr", "train", "fare"],
+    "shopping": ["shop", "store", "mall", "purchase", "buy"],
+    "entertainment": ["movie", "cinema", "theater", "game", "entertainment"],
+    "utilities": ["bill", "utility", "electric", "water", "gas", "internet"],
+    "housing": ["rent", "mortgage", "housing", "maintenance"],
+    "healthcare": ["doctor", "hospital", "medicine", "healthcare", "medical"],
+    "education": ["tuition", "school", "course", "book", "education"],
+}
+
+UNCATEGORIZED = "other"
+
+
+def _trie_pattern(node):
+    """Turn a character trie into a prefix-factored regex, so shared prefixes are only tried once"""
+    terminal = '' in node
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ''
+    body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if terminal:
+        if len(branches) == 1 and len(body) > 1:
+            body = '(?:' + body + ')'
+        body += '?'
+    return body
+
+
+class CategoryMatcher:
+    """
+    Multi-pattern keyword matcher for spending categorisation.
+
+    All keywords are compiled into a single trie-shaped regular expression,
+    which plays the role of an Aho-Corasick automaton: each description is
+    scanned once, in C, instead of once per keyword. Matching is
+    case-insensitive substring matching, like the original keyword loops.
+
+    Args:
+        rules (dict): Category name -> list of keywords, in priority order
+    """
+
+    def __init__(self, rules):
+        self.categories = list(rules)
+        priority = {category: rank for rank, category in enumerate(self.categories)}
+
+        # keyword -> rank of the highest-priority category using it
+        keyword_rank = {}
+        for category, keywords in rules.items():
+            for keyword in keywords:
+                keyword = keyword.lower()
+                if keyword and keyword not in keyword_rank:
+                    keyword_rank[keyword] = priority[category]
+
+        trie = {}
+        for keyword in keyword_rank:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = True
+
+        # The regex returns the longest keyword starting at each position;
+        # fold in every shorter keyword that is a prefix of it
+        self._ranks = {}
+        for keyword in keyword_rank:
+            self._ranks[keyword] = {
+                rank for other, rank in keyword_rank.items() if keyword.startswith(other)
+            }
+
+        # A zero-width lookahead reports keywords starting at every position,
+        # including ones that overlap an earlier match
+        self._pattern = re.compile(f"(?=({_trie_pattern(trie)}))") if trie else None
+
+    def match_all(self, description):
+        """Return every category whose keywords occur in the description, in priority order"""
+        if not description or self._pattern is None:
+            return []
+        ranks = set()
+        for keyword in self._pattern.findall(description.lower()):
+            ranks |= self._ranks[keyword]
+        return [self.categories[rank] for rank in sorted(ranks)]
+
+    def categorize(self, description):
+        """Return the highest-priority matching category, or 'other'"""
+        if not description or self._pattern is None:
+            return UNCATEGORIZED
+        best = None
+        for keyword in self._pattern.findall(description.lower()):
+            rank = min(self._ranks[keyword])
+            if best is None or rank < best:
+                best = rank
+                if best == 0:
+                    break
+        return UNCATEGORIZED if best is None else self.categories[best]
+
+
+@lru_cache(maxsize=64)
+def _compiled(rules_key):
+    return CategoryMatcher({category: list(keywords) for category, keywords in rules_key})
+
+
+def get_matcher(user_rules=None):
+    """
+    Return a compiled matcher for the default rules plus optional user-defined rules.
+
+    Matchers are compiled once per distinct rule set and then reused.
+
+    Args:
+        user_rules (dict, optional): Category name -> keywords. User categories take
+            priority over the defaults; keywords for an existing category are added to it.
+
+    Returns:
+        CategoryMatcher: The compiled matcher
+    """
+    rules = {}
+    for category, keywords in (user_rules or {}).items():
+        rules[category] = list(keywords)
+    for category, keywords in DEFAULT_CATEGORY_KEYWORDS.items():
+        rules.setdefault(category, []).extend(keywords)
+    rules_key = tuple((category, tuple(keywords)) for category, keywords in rules.items())
+    return _compiled(rules_key)
@@ -0,0 +1,255 @@
+import datetime
+import decimal
+import threading
+import time
+
+import config
+from database.connection import run_query
+from database.ledger import BALANCE_SQL
+
+# Rough size of a token in characters, used to enforce the context budget
+CHARS_PER_TOKEN = 4
+
+
+class UserContextCache:
+    """
+    Per-user snapshot of the account data the AI assistant is given as context.
+
+    A snapshot is loaded from MySQL the first time a user chats and is then
+    kept up to date in memory: transaction routes report new transactions
+    through apply_transaction(), so later chat turns need no database
+    round-trip at all. Anything the cache cannot apply precisely - including
+    the balances moved by a settlement - simply drops the affected snapshot
+    so it is reloaded on the next turn.
+
+    Args:
+        max_transactions (int): Recent transactions kept per user
+        token_budget (int): Approximate token limit for the rendered context;
+            older transactions are trimmed first
+        ttl (int): Seconds before a snapshot is reloaded regardless
+    """
+
+    def __init__(self, max_transactions=10, token_budget=1000, ttl=600):
+        self.max_transactions = max_transactions
+        self.token_budget = token_budget
+        self.ttl = ttl
+        self._snapshots = {}  # user_id -> snapshot dict
+        self._account_owners = {}  # account_id -> user_id, for cached users only
+        self._account_names = {}  # account_id -> account_name, learned from loaded rows
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_context(self, user_id):
+        """
+        Return the rendered context string for a user.
+
+        Returns:
+            str: Context text, or None if the user does not exist
+        """
+        return self._with_snapshot(user_id, self._rendered)
+
+    def get_accounts(self, user_id):
+        """
+        Return the user's accounts from the snapshot.
+
+        Returns:
+            list: Dicts with account_id, account_name, account_type, balance and
+                currency, or None if the user does not exist
+        """
+        return self._with_snapshot(user_id, lambda snapshot: [
+            dict(account, account_id=account_id) for account_id, account in snapshot['accounts'].items()
+        ])
+
+    def _with_snapshot(self, user_id, read):
+        """Run read(snapshot) under the lock, loading the snapshot first if needed"""
+        with self._lock:
+            snapshot = self._snapshots.get(user_id)
+            if snapshot is not None and time.monotonic() - snapshot['loaded_at'] <= self.ttl:
+                return read(snapshot)
+            generation = self._generation
+
+        snapshot = self._load(user_id)
+        if snapshot is None:
+            return None
+
+        with self._lock:
+            # Only keep the snapshot if nothing changed while it was loading
+            if generation == self._generation:
+                self._store(user_id, snapshot)
+            return read(snapshot)
+
+    def _rendered(self, snapshot):
+        if snapshot['rendered'] is None:
+            snapshot['rendered'] = self._render(snapshot)
+        return snapshot['rendered']
+
+    def _load(self, user_id):
+        return run_query(lambda cursor: self._read_snapshot(cursor, user_id))
+
+    def _read_snapshot(self, cursor, user_id):
+        cursor.execute(
+            f"""
+            SELECT u.username, a.account_id, a.account_name, a.account_type, {BALANCE_SQL} AS balance, a.currency
+            FROM users u
+            LEFT JOIN accounts a ON a.user_id = u.user_id
+            WHERE u.user_id = %s
+            ORDER BY a.account_id
+            """,
+            (user_id,)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return None
+
+        accounts = {
+            row['account_id']: {
+                'account_name': row['account_name'],
+                'account_type': row['account_type'],
+                'balance': row['balance'],
+                'currency': row['currency'],
+            }
+            for row in rows if row['account_id'] is not None
+        }
+
+        transactions = []
+        if accounts:
+            # Two index range scans instead of an OR across both joins
+            placeholders = ', '.join(['%s'] * len(accounts))
+            account_ids = list(accounts)
+            cursor.execute(
+                f"""
+                SELECT t.transaction_id, t.source_account_id, t.destination_account_id, t.amount,
+                       t.transaction_type, t.description, t.transaction_date, t.status,
+                       sa.account_name AS source_account, da.account_name AS destination_account
+                FROM (
+                    (SELECT * FROM transactions WHERE source_account_id IN ({placeholders})
+                     ORDER BY transaction_date DESC LIMIT %s)
+                    UNION
+                    (SELECT * FROM transactions WHERE destination_account_id IN ({placeholders})
+                     ORDER BY transaction_date DESC LIMIT %s)
+                ) t
+                LEFT JOIN accounts sa ON t.source_account_id = sa.account_id
+                LEFT JOIN accounts da ON t.destination_account_id = da.account_id
+                ORDER BY t.transaction_date DESC, t.transaction_id DESC
+                LIMIT %s
+                """,
+                account_ids + [self.max_transactions] + account_ids + [self.max_transactions]
+                + [self.max_transactions]
+            )
+            transactions = cursor.fetchall()
+
+        return {
+            'username': rows[0]['username'],
+            'accounts': accounts,
+            'transactions': transactions,
+            'loaded_at': time.monotonic(),
+            'rendered': None,
+        }
+
+    def _store(self, user_id, snapshot):
+        self._drop(user_id)
+        self._snapshots[user_id] = snapshot
+        for account_id, account in snapshot['accounts'].items():
+            self._account_owners[account_id] = user_id
+            self._account_names[account_id] = account['account_name']
+        for txn in snapshot['transactions']:
+            for id_key, name_key in (('source_account_id', 'source_account'),
+                                     ('destination_account_id', 'destination_account')):
+                if txn[id_key] is not None and txn[name_key] is not None:
+                    self._account_names[txn[id_key]] = txn[name_key]
+
+    def _drop(self, user_id):
+        snapshot = self._snapshots.pop(user_id, None)
+        if snapshot is not None:
+            for account_id in snapshot['accounts']:
+                if self._account_owners.get(account_id) == user_id:
+                    del self._account_owners[account_id]
+
+    def _render(self, snapshot):
+        lines = [f"User: {snapshot['username']}", "", "Accounts:"]
+        for account in snapshot['accounts'].values():
+            lines.append(
+                f"- {account['account_name']} ({account['account_type']}): "
+                f"{account['balance']} {account['currency']}"
+            )
+        lines.extend(["", "Recent Transactions:"])
+
+        budget = self.token_budget * CHARS_PER_TOKEN - sum(len(line) + 1 for line in lines)
+        for txn in snapshot['transactions']:
+            source = txn['source_account'] if txn['source_account'] else 'External'
+            destination = txn['destination_account'] if txn['destination_account'] else 'External'
+            line = (f"- {txn['transaction_date']}: {txn['amount']} from {source} to {destination} "
+                    f"- {txn['description']} ({txn['status']})")
+            budget -= len(line) + 1
+            if budget < 0:
+                break
+            lines.append(line)
+
+        return "\n".join(lines) + "\n"
+
+    def apply_transaction(self, txn, settled=False):
+        """
+        Fold a new or updated transaction into every cached snapshot it touches.
+
+        Args:
+            txn (dict): Transaction row with at least transaction_id, source_account_id,
+                destination_account_id, amount, transaction_type, description, status
+                and transaction_date
+            settled (bool): True when the transaction has just been settled. Balances
+                cannot be patched with deltas - a snapshot loaded after the
+                commit already includes them - so the snapshots are dropped
+                and reloaded on the next turn instead.
+        """
+        amount = decimal.Decimal(str(txn['amount'])).quantize(decimal.Decimal('0.01'))
+        with self._lock:
+            self._generation += 1
+            owners = {
+                self._account_owners[account_id]
+                for account_id in (txn.get('source_account_id'), txn.get('destination_account_id'))
+                if account_id in self._account_owners
+            }
+            if settled:
+                for user_id in owners:
+                    self._drop(user_id)
+                return
+            for user_id in owners:
+                snapshot = self._snapshots[user_id]
+                names = {}
+                for id_key in ('source_account_id', 'destination_account_id'):
+                    account_id = txn.get(id_key)
+                    names[id_key] = self._account_names.get(account_id) if account_id is not None else None
+                if any(txn.get(id_key) is not None and name is None for id_key, name in names.items()):
+                    # Counterparty name unknown; reload on the next turn instead of guessing
+                    self._drop(user_id)
+                    continue
+
+                entry = {
+                    'transaction_id': txn['transaction_id'],
+                    'source_account_id': txn.get('source_account_id'),
+                    'destination_account_id': txn.get('destination_account_id'),
+                    'amount': amount,
+                    'transaction_type': txn['transaction_type'],
+                    'description': txn.get('description'),
+                    'transaction_date': txn.get('transaction_date') or datetime.datetime.now().replace(microsecond=0),
+                    'status': txn['status'],
+                    'source_account': names['source_account_id'],
+                    'destination_account': names['destination_account_id'],
+                }
+                recent = [t for t in snapshot['transactions'] if t['transaction_id'] != entry['transaction_id']]
+                recent.append(entry)
+                recent.sort(key=lambda t: (t['transaction_date'], t['transaction_id']), reverse=True)
+                snapshot['transactions'] = recent[:self.max_transactions]
+                snapshot['rendered'] = None
+
+    def invalidate_user(self, user_id):
+        """Forget a user's snapshot so the next chat turn reloads it"""
+        with self._lock:
+            self._generation += 1
+            self._drop(user_id)
+
+
+user_context = UserContextCache(
+    max_transactions=config.AI_CONTEXT_MAX_TRANSACTIONS,
+    token_budget=config.AI_CONTEXT_TOKEN_BUDGET,
+    ttl=config.AI_CONTEXT_TTL
+)
@@ -1,10 +1,52 @@
+import json
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import config
 
+_session = None
+_session_lock = threading.Lock()
 
-def generate_ai_response(prompt, context=None, template_name='financial_analysis'):
+
+def get_session():
     """
-    Generate a response from the Llama model via Ollama.
+    Return the shared HTTP session used to talk to Ollama.
+
+    The session keeps connections alive between calls (urllib3's pool is
+    thread-safe, so one session serves every Flask worker thread) and retries
+    connection failures and 502/503/504 responses with exponential backoff.
+    Read timeouts are not retried so a hung server costs at most one timeout.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = Retry(
+                    total=config.OLLAMA_MAX_RETRIES,
+                    connect=config.OLLAMA_MAX_RETRIES,
+                    read=0,
+                    status=config.OLLAMA_MAX_RETRIES,
+                    backoff_factor=config.OLLAMA_RETRY_BACKOFF,
+                    status_forcelist=(502, 503, 504),
+                    allowed_methods=frozenset(['POST']),
+                    raise_on_status=False
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=config.OLLAMA_POOL_MAXSIZE,
+                    max_retries=retry
+                )
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
+def build_prompt(prompt, context=None, template_name='financial_analysis'):
+    """
+    Build the full prompt sent to Ollama.
 
     Args:
         prompt (str): The user's query
@@ -12,7 +54,7 @@ def generate_ai_response(prompt, context=None, template_name='financial_analysis
         template_name (str): The prompt template to use
 
     Returns:
-        str: The AI-generated response
+        str: The prompt with template, context and the concise instruction applied
     """
     concise_instruction = "Answer concisely and concretely. Do not provide unnecessary detail."
 
@@ -26,23 +68,94 @@ def generate_ai_response(prompt, context=None, template_name='financial_analysis
         full_prompt = prompt
 
     # Insert the concise instruction
-    full_prompt = f"{concise_instruction}\n{full_prompt}"
+    return f"{concise_instruction}\n{full_prompt}"
 
-    # Prepare the request to Ollama
-    payload = {
+
+def _build_payload(full_prompt, stream):
+    return {
         "model": config.OLLAMA_MODEL,
         "prompt": full_prompt,
-        "stream": False,
+        "stream": stream,
+        "keep_alive": config.OLLAMA_KEEP_ALIVE,
         "temperature": config.AI_TEMPERATURE,
         "max_tokens": config.AI_MAX_TOKENS
     }
 
+
+def generate_ai_response(prompt, context=None, template_name='financial_analysis'):
+    """
+    Generate a response from the Llama model via Ollama.
+
+    Args:
+        prompt (str): The user's query
+        context (str, optional): Additional context information
+        template_name (str): The prompt template to use
+
+    Returns:
+        str: The AI-generated response
+    """
+    payload = _build_payload(build_prompt(prompt, context, template_name), stream=False)
+
     try:
-        response = requests.post(config.OLLAMA_API_URL, json=payload)
+        response = get_session().post(
+            config.OLLAMA_API_URL,
+            json=payload,
+            timeout=(config.OLLAMA_CONNECT_TIMEOUT, config.OLLAMA_READ_TIMEOUT)
+        )
         if response.status_code == 200:
             result = response.json()
             return result.get('response', 'No response generated')
         else:
             return f"Error: Received status code {response.status_code} from Ollama"
+    except requests.exceptions.Timeout:
+        return "Error: Ollama did not respond in time"
+    except Exception as e:
+        return f"Error connecting to Ollama: {str(e)}"
+
+
+def stream_ai_response(prompt, context=None, template_name='financial_analysis', outcome=None):
+    """
+    Stream a response from the Llama model via Ollama, token by token.
+
+    Takes the same arguments as generate_ai_response(). Failures are yielded
+    as a final chunk worded like generate_ai_response()'s error strings, so
+    they may follow real tokens. Pass an outcome dict to tell the two apart:
+    outcome['complete'] is set to True only once Ollama reports done without
+    an error.
+
+    Yields:
+        str: Response fragments as Ollama produces them
+    """
+    if outcome is None:
+        outcome = {}
+    outcome['complete'] = False
+    payload = _build_payload(build_prompt(prompt, context, template_name), stream=True)
+
+    try:
+        with get_session().post(
+            config.OLLAMA_API_URL,
+            json=payload,
+            stream=True,
+            timeout=(config.OLLAMA_CONNECT_TIMEOUT, config.OLLAMA_READ_TIMEOUT)
+        ) as response:
+            if response.status_code != 200:
+                yield f"Error: Received status code {response.status_code} from Ollama"
+                return
+
+            # Ollama streams one JSON object per line
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get('error'):
+                    yield f"Error: {chunk['error']}"
+                    return
+                if chunk.get('response'):
+                    yield chunk['response']
+                if chunk.get('done'):
+                    outcome['complete'] = True
+                    return
+    except requests.exceptions.Timeout:
+        yield "Error: Ollama did not respond in time"
     except Exception as e:
-        return f"Error connecting to Ollama: {str(e)}"
\ No newline at end of file
+        yield f"Error connecting to Ollama: {str(e)}"
@@ -2,11 +2,11 @@ from contextlib import nullcontext
 from typing import List
 import json
 import re
+import threading
 from langchain_core.tools import tool
 from langchain_ollama import ChatOllama
-from transactions.routes import get_db_connection
-
-conn = get_db_connection()
+import config
+from ai.account_index import account_index
 
 
 @tool
@@ -19,17 +19,9 @@ def withdraw_money(user_id: int, source_account: str, amount: int, description:
         amount (int): the amount of money
         description (str): the usage of the withdrawal money
     """
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute(
-        f"""
-        SELECT account_id FROM accounts
-        WHERE user_id = {user_id} and account_name = '{source_account}';
-        """
-    )
-    source_id = cursor.fetchone()
-    source_id_number = source_id['account_id']
+    source = account_index.resolve(user_id, source_account)
     output = {
-        'source_account_id': source_id_number,
+        'source_account_id': source['account_id'],
         'destination_account_id': None,
         'transaction_type': "Withdrawal",
         'amount': amount,
@@ -50,24 +42,11 @@ def transfer_money(user_id: int, source_account: str, target_account: str, amoun
         target_account (str): the target account user want to transfer to
         description (str): the usage of the withdrawal money
     """
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute(
-        f"""
-        SELECT account_id FROM accounts
-        WHERE user_id = {user_id} and account_name LIKE '%{source_account}%';
-        """
-    )
-    source_id = cursor.fetchone()['account_id']
-    cursor.execute(
-        f"""
-        SELECT account_id FROM accounts
-        WHERE user_id = {user_id} and account_name LIKE '%{target_account}%';
-        """
-    )
-    target_id = cursor.fetchone()['account_id']
+    source = account_index.resolve(user_id, source_account)
+    target = account_index.resolve(user_id, target_account)
     output = {
-        'source_account_id': source_id,
-        'destination_account_id': target_id,
+        'source_account_id': source['account_id'],
+        'destination_account_id': target['account_id'],
         'transaction_type': "Transfer",
         'amount': amount,
         'description': description
@@ -78,18 +57,8 @@ def transfer_money(user_id: int, source_account: str, target_account: str, amoun
 # Define the tools
 tools = [transfer_money, withdraw_money]
 
-
-# Create a simple function to parse and execute the tool
-def execute_tools_directly(query):
-    tool_dict = {tool.name: tool for tool in tools}
-    # Initialize the LLM
-    llm = ChatOllama(
-        model="llama3.2",
-        temperature=0,
-    )
-
-    # Create a system prompt to encourage direct tool usage
-    system_message = """You are an assistant that helps with executing tools. 
+# Base system prompt to encourage direct tool usage
+TOOL_SYSTEM_PROMPT = """You are an assistant that helps with executing tools. 
     When responding, ALWAYS use the following format:
 
     Tool: <tool_name>
@@ -102,9 +71,52 @@ def execute_tools_directly(query):
 
     Use only the tools that are available to you."""
 
-    # Add descriptions of available tools
-    for tool in tools:
-        system_message += f"\n\nTool: {tool.name}\nDescription: {tool.description}\n"
+TOOL_PATTERN = re.compile(r"Tool: (\w+)")
+ARGS_PATTERN = re.compile(r"Arguments:\s*(\{.*?\})", re.DOTALL)
+
+_llm = None
+_llm_lock = threading.Lock()
+_registry = None
+
+
+def get_llm():
+    """Return the process-wide ChatOllama client, creating it on first use"""
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                _llm = ChatOllama(
+                    model=config.OLLAMA_MODEL,
+                    temperature=0,
+                    keep_alive=config.OLLAMA_KEEP_ALIVE,
+                )
+    return _llm
+
+
+def get_tool_registry():
+    """
+    Return (tool_dict, system_message) for the current tool list.
+
+    Both are built once and only rebuilt when the names or descriptions in
+    `tools` change.
+    """
+    global _registry
+    key = tuple((t.name, t.description) for t in tools)
+    registry = _registry
+    if registry is None or registry[0] != key:
+        tool_dict = {t.name: t for t in tools}
+        system_message = TOOL_SYSTEM_PROMPT + "".join(
+            f"\n\nTool: {name}\nDescription: {description}\n" for name, description in key
+        )
+        registry = (key, tool_dict, system_message)
+        _registry = registry
+    return registry[1], registry[2]
+
+
+# Create a simple function to parse and execute the tool
+def execute_tools_directly(query, llm=None):
+    tool_dict, system_message = get_tool_registry()
+    llm = llm or get_llm()
 
     # Invoke the LLM
     response = llm.invoke([
@@ -115,8 +127,8 @@ def execute_tools_directly(query):
     print(f"LLM Response:\n{response.content}")
 
     # Extract tool and arguments
-    tool_match = re.search(r"Tool: (\w+)", response.content)
-    args_match = re.search(r"Arguments:\s*(\{.*?\})", response.content, re.DOTALL)
+    tool_match = TOOL_PATTERN.search(response.content)
+    args_match = ARGS_PATTERN.search(response.content)
 
     if tool_match and args_match:
         tool_name = tool_match.group(1)
@@ -1,9 +1,16 @@
-def analyze_spending_patterns(transactions):
+import re
+
+from ai.categorizer import get_matcher
+
+
+def analyze_spending_patterns(transactions, category_rules=None):
     """
     Analyze user spending patterns from transaction history.
 
     Args:
         transactions (list): List of transaction dictionaries
+        category_rules (dict, optional): User-defined category -> keywords rules,
+            checked before the default categories
 
     Returns:
         dict: Analysis results with categories and trends
@@ -21,32 +28,16 @@ def analyze_spending_patterns(transactions):
     # Extract categories from transaction descriptions
     categories = {}
 
-    # Simple category detection from keywords
-    category_keywords = {
-        "food": ["restaurant", "cafe", "grocery", "food", "meal", "dining"],
-        "transport": ["transport", "uber", "taxi", "bus", "mtr", "train", "fare"],
-        "shopping": ["shop", "store", "mall", "purchase", "buy"],
-        "entertainment": ["movie", "cinema", "theater", "game", "entertainment"],
-        "utilities": ["bill", "utility", "electric", "water", "gas", "internet"],
-        "housing": ["rent", "mortgage", "housing", "maintenance"],
-        "healthcare": ["doctor", "hospital", "medicine", "healthcare", "medical"],
-        "education": ["tuition", "school", "course", "book", "education"],
-    }
+    # Keyword rules compiled into a single-pass matcher, built once per rule set
+    matcher = get_matcher(category_rules)
 
     # Categorize transactions
     for transaction in transactions:
         if transaction['transaction_type'] != 'Withdrawal':
             continue
 
-        description = transaction['description'].lower() if transaction['description'] else ""
         amount = float(transaction['amount'])
-
-        # Determine category
-        category = "other"
-        for cat, keywords in category_keywords.items():
-            if any(keyword in description for keyword in keywords):
-                category = cat
-                break
+        category = matcher.categorize(transaction['description'])
 
         # Add to categories
         if category not in categories:
@@ -118,4 +109,85 @@ def extract_transaction_intent(message):
                 "detected": True
             }
 
-    return {"detected": False}
\ No newline at end of file
+    return {"detected": False}
+
+# Amount with an optional currency marker before or after it, e.g. "HK$1,200.50" or "500 hkd"
+_AMOUNT = r"(?:hk\$|\$|hkd\s*)?(?P<amount>\d{1,3}(?:,\d{3})+(?:\.\d{1,2})?|\d+(?:\.\d{1,2})?)(?:\s*(?:hkd|dollars?))?"
+_ACCOUNT = r"(?:my\s+|the\s+)?(?P<{name}>[a-z0-9#' -]+?)(?:\s+account)?"
+_PURPOSE = r"(?:\s+(?:for|as|memo:?)\s+(?P<description>.+?))?"
+
+_TRANSFER_PATTERNS = [
+    re.compile(
+        rf"^(?:please\s+)?(?:transfer|send|move|pay)\s+{_AMOUNT}\s+from\s+{_ACCOUNT.format(name='source')}"
+        rf"\s+(?:to|into)\s+{_ACCOUNT.format(name='target')}{_PURPOSE}$",
+        re.IGNORECASE
+    ),
+    re.compile(
+        rf"^(?:please\s+)?(?:transfer|send|move|pay)\s+{_AMOUNT}\s+(?:to|into)\s+{_ACCOUNT.format(name='target')}"
+        rf"\s+from\s+{_ACCOUNT.format(name='source')}{_PURPOSE}$",
+        re.IGNORECASE
+    ),
+]
+_WITHDRAW_PATTERN = re.compile(
+    rf"^(?:please\s+)?withdraw\s+{_AMOUNT}\s+from\s+{_ACCOUNT.format(name='source')}{_PURPOSE}$",
+    re.IGNORECASE
+)
+_USER_ID_SUFFIX = re.compile(r"\s*\(user id:[^)]*\)\s*$")
+_NAME_NOISE = {'my', 'the', 'account', 'acct'}
+
+
+def account_name_tokens(name):
+    """Lower-case word tokens of an account name, without filler like 'my' or 'account'"""
+    return [token for token in re.split(r"[^a-z0-9#]+", name.lower()) if token and token not in _NAME_NOISE]
+
+
+def parse_transaction_request(message, resolve):
+    """
+    Resolve fully structured transfer or withdrawal requests without the LLM.
+
+    Only unambiguous requests are handled: the amount must be explicit and every
+    account phrase must match exactly one of the user's accounts.
+
+    Args:
+        message (str): The user's request, e.g. "transfer 500 from Savings to Checking for rent"
+        resolve (callable): resolve(phrase) returns the matching account (a dict
+            with account_id and account_name), or None if nothing or more than
+            one account matches. The caller passes the same resolver the LLM
+            tools use, so both paths pick the same account for a phrase.
+
+    Returns:
+        dict: Transaction details in the same shape the LLM tools return, or None
+            if the request should fall through to the LLM
+    """
+    text = _USER_ID_SUFFIX.sub("", message).strip().rstrip('.!')
+    text = re.sub(r"\s+", " ", text)
+
+    for pattern in _TRANSFER_PATTERNS:
+        match = pattern.match(text)
+        if match:
+            source = resolve(match.group('source'))
+            target = resolve(match.group('target'))
+            if not source or not target or source['account_id'] == target['account_id']:
+                return None
+            return {
+                'source_account_id': source['account_id'],
+                'destination_account_id': target['account_id'],
+                'transaction_type': "Transfer",
+                'amount': float(match.group('amount').replace(',', '')),
+                'description': match.group('description')
+            }
+
+    match = _WITHDRAW_PATTERN.match(text)
+    if match:
+        source = resolve(match.group('source'))
+        if not source:
+            return None
+        return {
+            'source_account_id': source['account_id'],
+            'destination_account_id': None,
+            'transaction_type': "Withdrawal",
+            'amount': float(match.group('amount').replace(',', '')),
+            'description': match.group('description')
+        }
+
+    return None
@@ -0,0 +1,116 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import config
+
+
+def normalise_prompt(prompt):
+    """Lower-case, collapse whitespace and drop trailing punctuation"""
+    return ' '.join(prompt.lower().split()).rstrip('?!. ')
+
+
+def make_cache_key(user_id, template_name, prompt, context):
+    """
+    Build the cache key for an AI chat answer.
+
+    Args:
+        user_id (int): The user asking
+        template_name (str): The prompt template used
+        prompt (str): The user's query
+        context (str): The account context the answer is based on
+
+    Returns:
+        str: Hex digest identifying the (user, template, prompt, context) tuple
+    """
+    context_digest = hashlib.sha256((context or '').encode('utf-8')).hexdigest()
+    raw = '\x1f'.join([str(user_id), template_name, normalise_prompt(prompt), context_digest])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def is_error_response(text):
+    """llama_client reports failures as text; those must never be cached"""
+    return not text or text.startswith('Error')
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache of AI answers with a per-entry TTL.
+
+    Entries are also indexed by user so that everything cached for a user can
+    be dropped as soon as one of their accounts or transactions changes.
+    """
+
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, user_id, value)
+        self._by_user = {}  # user_id -> set of keys
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+        }
+
+    def _drop(self, key):
+        _, user_id, _ = self._entries.pop(key)
+        keys = self._by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[user_id]
+
+    def get(self, key):
+        """Return the cached answer for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            if entry[0] <= time.monotonic():
+                self._drop(key)
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[2]
+
+    def set(self, key, user_id, value):
+        """Store an answer, evicting the least recently used entries when full"""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, user_id, value)
+            self._by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def invalidate_user(self, user_id):
+        """Drop every cached answer for a user"""
+        with self._lock:
+            keys = self._by_user.pop(user_id, None)
+            if not keys:
+                return
+            for key in keys:
+                self._entries.pop(key, None)
+            self._stats['invalidations'] += len(keys)
+
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['entries'] = len(self._entries)
+            snapshot['max_entries'] = self.max_entries
+            snapshot['ttl'] = self.ttl
+        return snapshot
+
+
+response_cache = ResponseCache(max_entries=config.AI_CACHE_MAX_ENTRIES, ttl=config.AI_CACHE_TTL)
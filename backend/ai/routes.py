@@ -1,23 +1,31 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 import mysql.connector
 import config
+from database.connection import get_db_connection
 import jwt
 from functools import wraps
-from ai.llama_client import generate_ai_response
+from ai.llama_client import generate_ai_response, stream_ai_response
 from ai.llm_tools import execute_tools_directly
+from ai.response_cache import response_cache, make_cache_key, is_error_response
+from ai.context import user_context
+from ai.account_index import account_index
+from ai.processors import parse_transaction_request
+from ai.analytics import load_withdrawals, spending_summary
 from langchain_core.tools import Tool
 import re
+import json
+import threading
 
 ai_bp = Blueprint('ai', __name__)
 
+# How often /financial_tool resolves requests locally versus via the LLM
+tool_path_stats = {'fast_path': 0, 'llm': 0}
+_tool_path_lock = threading.Lock()
 
-def get_db_connection():
-    return mysql.connector.connect(
-        host=config.DB_HOST,
-        user=config.DB_USER,
-        password=config.DB_PASSWORD,
-        database=config.DB_NAME
-    )
+
+def _count_tool_path(path):
+    with _tool_path_lock:
+        tool_path_stats[path] += 1
 
 
 def token_required(f):
@@ -41,6 +49,40 @@ def token_required(f):
     return decorated
 
 
+def _sse_response(tokens):
+    """
+    Relay a token generator as server-sent events.
+
+    Each event carries {"token": ...}; the stream ends with {"done": true}.
+    """
+    def events():
+        for token in tokens:
+            yield f"data: {json.dumps({'token': token})}\n\n"
+        yield f"data: {json.dumps({'done': True})}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def _cache_stream(tokens, outcome, cache_key, user_id):
+    """
+    Pass tokens through and cache the full answer once the stream completes.
+
+    outcome is the dict given to stream_ai_response(); an answer cut short
+    by a timeout, dropped connection or Ollama error is never cached.
+    """
+    parts = []
+    for token in tokens:
+        parts.append(token)
+        yield token
+    answer = ''.join(parts)
+    if outcome.get('complete') and not is_error_response(answer):
+        response_cache.set(cache_key, user_id, answer)
+
+
 @ai_bp.route('/chat', methods=['POST'])
 @token_required
 def chat(current_user_id):
@@ -50,70 +92,47 @@ def chat(current_user_id):
     if not message:
         return jsonify({'error': 'No message provided'}), 400
 
-    # Get user context data
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    wants_stream = bool(data.get('stream')) or 'text/event-stream' in request.headers.get('Accept', '')
 
+    # Get user context data; served from memory after the first turn
     try:
-        # Get user info
-        cursor.execute(
-            "SELECT username FROM users WHERE user_id = %s",
-            (current_user_id,)
-        )
-        user = cursor.fetchone()
-
-        # Get account information
-        cursor.execute(
-            "SELECT account_id, account_name, account_type, balance, currency FROM accounts WHERE user_id = %s",
-            (current_user_id,)
-        )
-        accounts = cursor.fetchall()
-
-        # Get recent transactions
-        cursor.execute(
-            """
-            SELECT t.transaction_id, t.amount, t.transaction_type, t.description, t.transaction_date, t.status,
-                   sa.account_name as source_account, da.account_name as destination_account
-            FROM transactions t
-            LEFT JOIN accounts sa ON t.source_account_id = sa.account_id
-            LEFT JOIN accounts da ON t.destination_account_id = da.account_id
-            WHERE sa.user_id = %s OR da.user_id = %s
-            ORDER BY t.transaction_date DESC
-            LIMIT 10
-            """,
-            (current_user_id, current_user_id)
-        )
-        transactions = cursor.fetchall()
-
-        # Format context data for AI
-        context = f"User: {user['username']}\n\nAccounts:\n"
-
-        for account in accounts:
-            context += f"- {account['account_name']} ({account['account_type']}): {account['balance']} {account['currency']}\n"
-
-        context += "\nRecent Transactions:\n"
-        for txn in transactions:
-            source = txn['source_account'] if txn['source_account'] else 'External'
-            destination = txn['destination_account'] if txn['destination_account'] else 'External'
-            context += f"- {txn['transaction_date']}: {txn['amount']} from {source} to {destination} - {txn['description']} ({txn['status']})\n"
-
-        # Detect if this might be a transaction request and use appropriate template
-        is_transaction_intent = any(
-            keyword in message.lower() for keyword in ["transfer", "send", "pay", "withdraw", "deposit"])
-        template_name = 'transaction_help' if is_transaction_intent else 'financial_analysis'
-
-        # Generate AI response
-        ai_response = generate_ai_response(message, context, template_name)
+        context = user_context.get_context(current_user_id)
+    except mysql.connector.Error as err:
+        return jsonify({'error': str(err)}), 500
 
+    if context is None:
+        return jsonify({'error': 'User not found'}), 404
+
+    # Detect if this might be a transaction request and use appropriate template
+    is_transaction_intent = any(
+        keyword in message.lower() for keyword in ["transfer", "send", "pay", "withdraw", "deposit"])
+    template_name = 'transaction_help' if is_transaction_intent else 'financial_analysis'
+
+    # Repeated questions against unchanged account state skip Ollama
+    cache_key = make_cache_key(current_user_id, template_name, message, context)
+    cached_response = response_cache.get(cache_key)
+    if cached_response is not None:
+        if wants_stream:
+            return _sse_response(iter([cached_response]))
         return jsonify({
-            'response': ai_response
+            'response': cached_response,
+            'cached': True
         }), 200
 
-    except mysql.connector.Error as err:
-        return jsonify({'error': str(err)}), 500
-    finally:
-        cursor.close()
-        conn.close()
+    # Stream tokens as server-sent events when the client opts in
+    if wants_stream:
+        outcome = {}
+        tokens = stream_ai_response(message, context, template_name, outcome)
+        return _sse_response(_cache_stream(tokens, outcome, cache_key, current_user_id))
+
+    # Generate AI response
+    ai_response = generate_ai_response(message, context, template_name)
+    if not is_error_response(ai_response):
+        response_cache.set(cache_key, current_user_id, ai_response)
+
+    return jsonify({
+        'response': ai_response
+    }), 200
 
 
 
@@ -126,19 +145,45 @@ def financial_tool_endpoint(current_user_id):
     if not query:
         return jsonify({'error': 'No query provided'}), 400
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    result = execute_tools_directly(query)
-    print(f"\nTool Execution Result: {result}")
-
+    # The tools borrow their own pooled connections, so no connection is
+    # held here while the LLM is thinking
     try:
-        return jsonify({'answer': result}), 200
+        # Fully structured requests are resolved locally; only ambiguous ones reach the LLM
+        result = parse_transaction_request(query, lambda phrase: account_index.lookup(current_user_id, phrase))
+        if result is not None:
+            _count_tool_path('fast_path')
+            return jsonify({'answer': result, 'path': 'fast_path'}), 200
+
+        _count_tool_path('llm')
+        result = execute_tools_directly(query)
+        print(f"\nTool Execution Result: {result}")
+        return jsonify({'answer': result, 'path': 'llm'}), 200
 
     except mysql.connector.Error as err:
         return jsonify({'error': str(err)}), 500
-    finally:
-        cursor.close()
-        conn.close()
 
 
+@ai_bp.route('/spending-analysis', methods=['GET', 'POST'])
+@token_required
+def spending_analysis(current_user_id):
+    data = request.get_json(silent=True) or {}
+    category_rules = data.get('category_rules')
+
+    if category_rules is not None and not (
+            isinstance(category_rules, dict)
+            and all(isinstance(keywords, list) and all(isinstance(k, str) for k in keywords)
+                    for keywords in category_rules.values())):
+        return jsonify({'error': 'category_rules must map category names to lists of keywords'}), 400
+
+    try:
+        window = request.args.get('window', type=int)
+        threshold = request.args.get('threshold', type=float)
+        if window is not None and window < 2:
+            return jsonify({'error': 'window must be at least 2 months'}), 400
+
+        columns = load_withdrawals(current_user_id)
+        analysis = spending_summary(columns, category_rules, window=window, threshold=threshold)
+        return jsonify(analysis), 200
+
+    except mysql.connector.Error as err:
+        return jsonify({'error': str(err)}), 500
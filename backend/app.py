@@ -4,7 +4,9 @@ from flask import Flask, jsonify
 from flask_cors import CORS
 from auth.routes import auth_bp
 from transactions.routes import transactions_bp
-from ai.routes import ai_bp
+from ai.routes import ai_bp, tool_path_stats
+from database.connection import get_pool_stats
+from ai.response_cache import response_cache
 import config
 import logging
 
@@ -30,5 +32,17 @@ app.register_blueprint(ai_bp, url_prefix=config.AI_ENDPOINT)
 def health_check():
     return jsonify({'status': 'healthy'})
 
+@app.route('/api/health/db')
+def db_pool_stats():
+    return jsonify(get_pool_stats())
+
+@app.route('/api/health/ai-cache')
+def ai_cache_stats():
+    return jsonify(response_cache.stats())
+
+@app.route('/api/health/ai-tools')
+def ai_tool_path_stats():
+    return jsonify(dict(tool_path_stats))
+
 if __name__ == '__main__':
     app.run(debug=config.DEBUG, host=config.HOST, port=config.PORT)
\ No newline at end of file
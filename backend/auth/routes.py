@@ -3,6 +3,7 @@ from werkzeug.security import generate_password_hash, check_password_hash
 import mysql.connector
 import config
 from .utils import generate_mfa_secret, get_totp_uri, generate_qr_code, verify_totp
+from database.connection import get_db_connection
 import jwt
 import datetime
 from werkzeug.security import check_password_hash
@@ -10,15 +11,6 @@ from werkzeug.security import check_password_hash
 auth_bp = Blueprint('auth', __name__)
 
 
-def get_db_connection():
-    return mysql.connector.connect(
-        host=config.DB_HOST,
-        user=config.DB_USER,
-        password=config.DB_PASSWORD,
-        database=config.DB_NAME
-    )
-
-
 @auth_bp.route('/register', methods=['POST'])
 def register():
     try:
@@ -87,7 +79,7 @@ def register():
         finally:
             if 'cursor' in locals():
                 cursor.close()
-            if 'conn' in locals() and conn.is_connected():
+            if 'conn' in locals():
                 conn.close()
             print("Connection closed")  # Debug log
 
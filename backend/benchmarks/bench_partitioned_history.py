@@ -0,0 +1,194 @@
+"""
+Benchmark transaction history latency before and after monthly partitioning.
+
+Builds a scratch database (<DB_NAME>_partition) with the app schema and
+indexes and fills it with synthetic transactions (50M by default, one every
+three seconds from 2016, spread over the accounts). It then converts the
+table with database.partitioning.migrate(), which keeps the original as
+transactions_unpartitioned, so both layouts stay side by side and later
+runs reuse them.
+
+Every history query built by transactions.utils.build_history_query() is
+run against both tables and the median latency is reported, together with
+the number of partitions EXPLAIN says the partitioned query reads.
+
+Usage:
+    python backend/benchmarks/bench_partitioned_history.py [transaction_rows] [repeat]
+"""
+import datetime
+import os
+import statistics
+import sys
+import time
+
+import mysql.connector
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from database import partitioning
+from database.db_setup import create_indexes
+from transactions.utils import build_history_query, keyset_condition
+
+SCRATCH_DB = f"{config.DB_NAME}_partition"
+ACCOUNTS = 1000
+USER_ACCOUNTS = [1, 2, 3]
+CHUNK = 100000
+PAGE = 50
+START = datetime.datetime(2016, 1, 1)
+SECONDS_PER_ROW = 3
+
+
+def connect(database=None):
+    return mysql.connector.connect(
+        host=config.DB_HOST,
+        user=config.DB_USER,
+        password=config.DB_PASSWORD,
+        database=database
+    )
+
+
+def load(conn, cursor, rows):
+    cursor.execute("SELECT COUNT(*) FROM transactions")
+    existing = cursor.fetchone()[0]
+    if existing >= rows:
+        print(f"Reusing {existing} transactions in {SCRATCH_DB}")
+        return
+
+    cursor.execute("SET foreign_key_checks = 0")
+    cursor.execute(
+        "INSERT IGNORE INTO users (user_id, username, email, password_hash, phone_number) "
+        "VALUES (1, 'partition', 'partition@example.com', '-', '-')"
+    )
+    cursor.executemany(
+        "INSERT IGNORE INTO accounts (account_id, user_id, account_name, account_type) VALUES (%s, 1, %s, 'Checking')",
+        [(account_id, f"Account {account_id}") for account_id in range(1, ACCOUNTS + 1)]
+    )
+    cursor.execute("CREATE TEMPORARY TABLE digits (d INT PRIMARY KEY)")
+    cursor.executemany("INSERT INTO digits VALUES (%s)", [(d,) for d in range(10)])
+
+    start = time.perf_counter()
+    for offset in range(existing, rows, CHUNK):
+        cursor.execute(
+            f"""
+            INSERT INTO transactions
+                (source_account_id, destination_account_id, amount, transaction_type,
+                 transaction_date, description, status, mfa_verified)
+            SELECT CASE WHEN MOD(n, 5) = 0 THEN NULL ELSE 1 + MOD(n * 7919, {ACCOUNTS}) END,
+                   CASE WHEN MOD(n, 5) = 1 THEN NULL ELSE 1 + MOD(n * 104729, {ACCOUNTS}) END,
+                   1 + MOD(n, 100000) / 100,
+                   ELT(1 + MOD(n, 3), 'Transfer', 'Deposit', 'Withdrawal'),
+                   TIMESTAMP('{START:%Y-%m-%d}') + INTERVAL n * {SECONDS_PER_ROW} SECOND,
+                   'synthetic',
+                   IF(MOD(n, 10) = 0, 'pending', 'completed'),
+                   TRUE
+            FROM (
+                SELECT %s + a.d + b.d * 10 + c.d * 100 + d.d * 1000 + e.d * 10000 AS n
+                FROM digits a, digits b, digits c, digits d, digits e
+            ) seq
+            WHERE n < %s
+            """,
+            (offset, rows)
+        )
+        conn.commit()
+        print(f"\rLoaded {min(offset + CHUNK, rows)} / {rows} rows", end='', flush=True)
+    print(f"\nLoad took {time.perf_counter() - start:.0f}s")
+
+
+def prepare(rows):
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS {SCRATCH_DB}")
+    cursor.execute(f"USE {SCRATCH_DB}")
+
+    if not partitioning.is_partitioned(cursor):
+        for schema in config.DB_SCHEMA.values():
+            cursor.execute(schema)
+        create_indexes(cursor, SCRATCH_DB)
+        load(conn, cursor, rows)
+
+        def report(done, total):
+            print(f"\rPartitioned {done} / {total} rows", end='', flush=True)
+
+        start = time.perf_counter()
+        partitioning.migrate(conn, chunk=CHUNK, pause=0, progress=report)
+        print(f"\nMigration took {time.perf_counter() - start:.0f}s")
+    else:
+        print(f"Reusing partitioned transactions in {SCRATCH_DB}")
+
+    for table in (config.TRANSACTIONS_TABLE, partitioning.OLD_TABLE):
+        cursor.execute(f"ANALYZE TABLE {table}")
+        cursor.fetchall()
+    cursor.close()
+    return conn
+
+
+def scenarios(rows):
+    end = START + datetime.timedelta(seconds=rows * SECONDS_PER_ROW)
+    middle = START + (end - START) / 2
+    month_from = datetime.datetime(middle.year, middle.month, 1)
+    month_to = partitioning.add_months(month_from, 1)
+    position = (middle, rows // 2)
+    return {
+        'first page': ([], [], False),
+        'older page': ([keyset_condition(False)], [position[0], position[0], position[1]], False),
+        'newer page': ([keyset_condition(True)], [position[0], position[0], position[1]], True),
+        'one month': (
+            ["t.transaction_date >= %s", "t.transaction_date < %s"],
+            [month_from, month_to],
+            False,
+        ),
+        'completed transfers, one week': (
+            ["t.transaction_type = %s", "t.status = %s", "t.transaction_date >= %s", "t.transaction_date < %s"],
+            ['Transfer', 'completed', month_from, month_from + datetime.timedelta(days=7)],
+            False,
+        ),
+    }
+
+
+def on_table(query, table):
+    return query.replace("FROM transactions t ", f"FROM {table} t ")
+
+
+def median_ms(cursor, query, params, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cursor.execute(query, params)
+        cursor.fetchall()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def partitions_read(cursor, query, params):
+    """Largest number of partitions any branch over transactions reads"""
+    cursor.execute("EXPLAIN " + query, params)
+    counts = [len(row['partitions'].split(',')) for row in cursor.fetchall()
+              if row['table'] == 't' and row.get('partitions')]
+    return max(counts) if counts else 0
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    conn = prepare(rows)
+    plain = conn.cursor()
+    partition_count = len(partitioning.partitions(plain))
+    plain.close()
+    cursor = conn.cursor(dictionary=True)
+
+    print(f"\nRows: {rows}, partitions: {partition_count}, repeat: {repeat}")
+    print(f"{'scenario':<32} {'unpartitioned':>14} {'partitioned':>12} {'partitions read':>16}")
+    for name, (filters, params, newer) in scenarios(rows).items():
+        query, query_params = build_history_query(USER_ACCOUNTS, filters, params, newer, PAGE + 1)
+        before = median_ms(cursor, on_table(query, partitioning.OLD_TABLE), query_params, repeat)
+        after = median_ms(cursor, query, query_params, repeat)
+        read = partitions_read(cursor, query, query_params)
+        print(f"{name:<32} {before:11.2f} ms {after:9.2f} ms {read:>16}")
+
+    cursor.close()
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
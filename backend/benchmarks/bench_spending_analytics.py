@@ -0,0 +1,83 @@
+"""
+Benchmark the columnar spending analytics on ten years of synthetic history.
+
+Compares ai.analytics.spending_summary() on column arrays with
+analyze_spending_patterns() on the row dicts it used to be given. The DB
+read is not included in either timing.
+
+Usage:
+    python backend/benchmarks/bench_spending_analytics.py [withdrawals_per_day]
+"""
+import datetime
+import decimal
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai.analytics import spending_summary
+from ai.processors import analyze_spending_patterns
+
+DESCRIPTIONS = [
+    "Grocery shopping", "Restaurant", "Taxi home", "MTR fare", "Electric bill", "Rent payment",
+    "Movie tickets", "Online shopping", "Doctor's appointment", "Course fee", "Coffee shop",
+    "Internet bill", "Water bill", "Gym membership", "ATM withdrawal",
+]
+
+
+def synthetic_history(per_day, years=10, seed=42):
+    rng = random.Random(seed)
+    start = datetime.datetime(2016, 1, 1)
+    rows = []
+    for day in range(365 * years):
+        date = start + datetime.timedelta(days=day)
+        for _ in range(per_day):
+            rows.append({
+                'transaction_type': 'Withdrawal',
+                'amount': decimal.Decimal(rng.randint(1000, 200000)) / 100,
+                'description': rng.choice(DESCRIPTIONS),
+                'transaction_date': date,
+            })
+    return rows
+
+
+def to_columns(rows):
+    """The shape load_withdrawals() returns: integer cents and month ordinals"""
+    return {
+        'amount_cents': np.array([int(row['amount'] * 100) for row in rows], dtype=np.int64),
+        'month': np.array([row['transaction_date'].year * 12 + row['transaction_date'].month - 1
+                           for row in rows], dtype=np.int32),
+        'description': [row['description'] for row in rows],
+    }
+
+
+def best_of(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    per_day = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    rows = synthetic_history(per_day)
+    columns = to_columns(rows)
+
+    row_s = best_of(lambda: analyze_spending_patterns(rows))
+    columnar_s = best_of(lambda: spending_summary(columns))
+    result = spending_summary(columns)
+
+    print(f"Withdrawals:                 {len(rows)} over 10 years")
+    print(f"analyze_spending_patterns(): {row_s * 1000:8.1f} ms")
+    print(f"spending_summary():          {columnar_s * 1000:8.1f} ms")
+    print(f"Months x categories:         {len(result['monthly']['months'])} x {len(result['categories'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Micro-benchmark for the per-request overhead of /api/ai/financial_tool.
+
+A stub LLM answers instantly, so the timings only cover the work done
+around inference: building the client, the tool registry and the system
+prompt, then parsing the reply.
+
+Usage:
+    python backend/benchmarks/bench_tool_dispatch.py [iterations]
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_ollama import ChatOllama
+from ai import llm_tools
+import config
+
+
+class StubMessage:
+    def __init__(self, content):
+        self.content = content
+
+
+class StubLLM:
+    """Answers every prompt with a fixed tool call, without any network I/O"""
+
+    reply = StubMessage('Tool: noop\nArguments: {"user_id": 1, "amount": 500}')
+
+    def invoke(self, messages):
+        return self.reply
+
+
+def legacy_setup():
+    """The work execute_tools_directly() used to repeat on every request"""
+    tool_dict = {tool.name: tool for tool in llm_tools.tools}
+    llm = ChatOllama(model=config.OLLAMA_MODEL, temperature=0)
+    system_message = llm_tools.TOOL_SYSTEM_PROMPT
+    for tool in llm_tools.tools:
+        system_message += f"\n\nTool: {tool.name}\nDescription: {tool.description}\n"
+    return tool_dict, llm, system_message
+
+
+def cached_setup():
+    tool_dict, system_message = llm_tools.get_tool_registry()
+    return tool_dict, llm_tools.get_llm(), system_message
+
+
+def time_per_call(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    stub = StubLLM()
+
+    legacy_us = time_per_call(legacy_setup, iterations)
+    cached_us = time_per_call(cached_setup, iterations)
+    with contextlib.redirect_stdout(io.StringIO()):
+        dispatch_us = time_per_call(lambda: llm_tools.execute_tools_directly("transfer 500", llm=stub), iterations)
+
+    print(f"Iterations:                        {iterations}")
+    print(f"Per-call setup, rebuilt each time: {legacy_us:10.1f} us")
+    print(f"Per-call setup, cached:            {cached_us:10.1f} us")
+    print(f"Full dispatch with stub LLM:       {dispatch_us:10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+EXPLAIN regression check for the transaction history query.
+
+Builds a scratch database (<DB_NAME>_explain) with the app schema and
+indexes, fills it with synthetic transactions (10M by default, loaded once
+and reused on later runs), then EXPLAINs the queries produced by
+transactions.utils.build_history_query() for the first page, an older page,
+a newer page and a filtered page.
+
+Every branch that reads `transactions` must be an index range/ref scan on
+one of the (account, transaction_date, transaction_id) indexes with no
+filesort. The only sort allowed is the final merge of the branch results,
+which is bounded by 2 * accounts * (limit + 1) rows. Exits with status 1 if
+any plan regresses.
+
+Usage:
+    python backend/benchmarks/explain_history.py [transaction_rows]
+"""
+import datetime
+import os
+import sys
+import time
+
+import mysql.connector
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from database.db_setup import create_indexes
+from transactions.utils import build_history_query, keyset_condition
+
+SCRATCH_DB = f"{config.DB_NAME}_explain"
+ACCOUNTS = 1000
+USER_ACCOUNTS = [1, 2, 3]
+CHUNK = 100000
+PAGE = 50
+
+
+def connect(database=None):
+    return mysql.connector.connect(
+        host=config.DB_HOST,
+        user=config.DB_USER,
+        password=config.DB_PASSWORD,
+        database=database
+    )
+
+
+def prepare(rows):
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS {SCRATCH_DB}")
+    cursor.execute(f"USE {SCRATCH_DB}")
+    for schema in config.DB_SCHEMA.values():
+        cursor.execute(schema)
+    create_indexes(cursor, SCRATCH_DB)
+
+    cursor.execute("SELECT COUNT(*) FROM transactions")
+    existing = cursor.fetchone()[0]
+    if existing >= rows:
+        print(f"Reusing {existing} transactions in {SCRATCH_DB}")
+        return conn
+
+    cursor.execute("SET foreign_key_checks = 0")
+    cursor.execute(
+        "INSERT IGNORE INTO users (user_id, username, email, password_hash, phone_number) "
+        "VALUES (1, 'explain', 'explain@example.com', '-', '-')"
+    )
+    cursor.executemany(
+        "INSERT IGNORE INTO accounts (account_id, user_id, account_name, account_type) VALUES (%s, 1, %s, 'Checking')",
+        [(account_id, f"Account {account_id}") for account_id in range(1, ACCOUNTS + 1)]
+    )
+    cursor.execute("CREATE TEMPORARY TABLE digits (d INT PRIMARY KEY)")
+    cursor.executemany("INSERT INTO digits VALUES (%s)", [(d,) for d in range(10)])
+
+    # 100k rows per statement from a five-way cross join of the digits;
+    # about one transaction every 30 seconds, spread over all accounts
+    start = time.perf_counter()
+    for offset in range(existing, rows, CHUNK):
+        cursor.execute(
+            f"""
+            INSERT INTO transactions
+                (source_account_id, destination_account_id, amount, transaction_type,
+                 transaction_date, description, status, mfa_verified)
+            SELECT CASE WHEN MOD(n, 5) = 0 THEN NULL ELSE 1 + MOD(n * 7919, {ACCOUNTS}) END,
+                   CASE WHEN MOD(n, 5) = 1 THEN NULL ELSE 1 + MOD(n * 104729, {ACCOUNTS}) END,
+                   1 + MOD(n, 100000) / 100,
+                   ELT(1 + MOD(n, 3), 'Transfer', 'Deposit', 'Withdrawal'),
+                   TIMESTAMP('2016-01-01') + INTERVAL n * 30 SECOND,
+                   'synthetic',
+                   IF(MOD(n, 10) = 0, 'pending', 'completed'),
+                   TRUE
+            FROM (
+                SELECT %s + a.d + b.d * 10 + c.d * 100 + d.d * 1000 + e.d * 10000 AS n
+                FROM digits a, digits b, digits c, digits d, digits e
+            ) seq
+            WHERE n < %s
+            """,
+            (offset, rows)
+        )
+        conn.commit()
+        print(f"\rLoaded {min(offset + CHUNK, rows)} / {rows} rows", end='', flush=True)
+    print(f"\nLoad took {time.perf_counter() - start:.0f}s")
+
+    cursor.execute("ANALYZE TABLE transactions")
+    cursor.fetchall()
+    return conn
+
+
+def keyset(newer, position):
+    return [keyset_condition(newer)], [position[0], position[0], position[1]]
+
+
+def scenarios():
+    middle = (datetime.datetime(2020, 6, 1), 5000000)
+    older_filters, older_params = keyset(False, middle)
+    newer_filters, newer_params = keyset(True, middle)
+    return {
+        'first page': ([], [], False),
+        'older page': (older_filters, older_params, False),
+        'newer page': (newer_filters, newer_params, True),
+        'completed transfers': (
+            ["t.transaction_type = %s", "t.status = %s"] + older_filters,
+            ['Transfer', 'completed'] + older_params,
+            False,
+        ),
+    }
+
+
+def check(cursor, name, filters, params, newer):
+    index_names = set(config.DB_INDEXES)
+    query, query_params = build_history_query(USER_ACCOUNTS, filters, params, newer, PAGE + 1)
+    cursor.execute("EXPLAIN " + query, query_params)
+    plan = cursor.fetchall()
+
+    problems = []
+    print(f"\n{name}")
+    for row in plan:
+        extra = row['Extra'] or ''
+        print(f"  {row['id']:>2} {row['select_type']:<12} {row['table']:<12} {row['type'] or '':<7} "
+              f"{row['key'] or '':<36} {row['rows'] or '':>8}  {extra}")
+        if row['table'] != 't':
+            continue
+        # Branches over the transactions table
+        if row['type'] not in ('ref', 'range') or row['key'] not in index_names:
+            problems.append(f"{name}: branch {row['id']} uses {row['type']} on {row['key']}")
+        if 'filesort' in extra:
+            problems.append(f"{name}: branch {row['id']} needs a filesort")
+    return problems
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000000
+    conn = prepare(rows)
+    cursor = conn.cursor(dictionary=True)
+
+    problems = []
+    for name, (filters, params, newer) in scenarios().items():
+        problems.extend(check(cursor, name, filters, params, newer))
+
+    cursor.close()
+    conn.close()
+
+    if problems:
+        print("\nFAILED")
+        for problem in problems:
+            print(f"  {problem}")
+        sys.exit(1)
+    print("\nOK: every branch is an index scan without a filesort")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Concurrency stress test for transaction settlement.
+
+Builds a scratch database (<DB_NAME>_stress) with one hot account and a
+set of counterparties, queues pending transfers both out of and into the
+hot account, and settles them from 64 threads at once. Every transaction
+is submitted twice, so duplicate verifications race each other as well.
+The hot account only holds enough to cover part of the outgoing transfers.
+With a batch size above 1, workers settle that many transactions at a
+time through settle_transactions, as /verify-batch does.
+
+Afterwards it checks that:
+- the total money across all accounts is unchanged,
+- no balance went negative,
+- every completed transaction was settled exactly once,
+- each account's balance equals its opening balance plus completed
+  incoming minus completed outgoing amounts,
+- no settlement failed for any reason other than insufficient funds or
+  being settled already,
+- the ledger sums to zero and its snapshots agree with it.
+
+Balances are the ones derived from the ledger.
+
+Exits with status 1 if any invariant is violated.
+
+Usage:
+    python backend/benchmarks/stress_settlement.py [transactions] [threads] [batch]
+"""
+import decimal
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+import mysql.connector
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from database import ledger
+from transactions.settlement import SettlementError, run_in_transaction, settle_transaction, settle_transactions
+
+SCRATCH_DB = f"{config.DB_NAME}_stress"
+HOT_ACCOUNT = 1
+COUNTERPARTIES = 8
+OPENING_BALANCE = decimal.Decimal('100000.00')
+
+
+def connect():
+    return mysql.connector.connect(
+        host=config.DB_HOST,
+        user=config.DB_USER,
+        password=config.DB_PASSWORD,
+        database=SCRATCH_DB
+    )
+
+
+def prepare(transaction_count, seed=7):
+    """Create a fresh scratch database and queue the pending transfers"""
+    conn = mysql.connector.connect(host=config.DB_HOST, user=config.DB_USER, password=config.DB_PASSWORD)
+    cursor = conn.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS {SCRATCH_DB}")
+    cursor.execute(f"CREATE DATABASE {SCRATCH_DB}")
+    cursor.execute(f"USE {SCRATCH_DB}")
+    for schema in config.DB_SCHEMA.values():
+        cursor.execute(schema)
+
+    cursor.execute(
+        "INSERT INTO users (user_id, username, email, password_hash, phone_number) "
+        "VALUES (1, 'stress', 'stress@example.com', '-', '-')"
+    )
+    accounts = range(HOT_ACCOUNT, HOT_ACCOUNT + COUNTERPARTIES + 1)
+    cursor.executemany(
+        "INSERT INTO accounts (account_id, user_id, account_name, account_type, balance) "
+        "VALUES (%s, 1, %s, 'Checking', %s)",
+        [(account_id, f"Account {account_id}", OPENING_BALANCE) for account_id in accounts]
+    )
+    ledger.backfill_opening_entries(cursor)
+
+    # Two thirds leave the hot account, one third arrives from a counterparty.
+    # Outgoing transfers total well over the hot balance, so some must fail.
+    rng = random.Random(seed)
+    transfers = []
+    for _ in range(transaction_count):
+        counterparty = rng.randint(HOT_ACCOUNT + 1, HOT_ACCOUNT + COUNTERPARTIES)
+        amount = decimal.Decimal(rng.randint(1000, 100000)) / 100
+        if rng.random() < 2 / 3:
+            transfers.append((HOT_ACCOUNT, counterparty, amount))
+        else:
+            transfers.append((counterparty, HOT_ACCOUNT, amount))
+    cursor.executemany(
+        "INSERT INTO transactions (source_account_id, destination_account_id, amount, transaction_type, status) "
+        "VALUES (%s, %s, %s, 'Transfer', 'pending')",
+        transfers
+    )
+    conn.commit()
+    cursor.execute("SELECT transaction_id FROM transactions")
+    transaction_ids = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    conn.close()
+    return transaction_ids
+
+
+def settle_one(conn, transaction_ids):
+    transaction_id = transaction_ids[0]
+    try:
+        run_in_transaction(conn, lambda cursor: settle_transaction(cursor, transaction_id))
+        return {transaction_id: 'settled'}
+    except SettlementError as e:
+        return {transaction_id: str(e)}
+
+
+def settle_batch(conn, transaction_ids):
+    settled, failed = run_in_transaction(conn, lambda cursor: settle_transactions(cursor, transaction_ids))
+    results = {transaction_id: str(error) for transaction_id, error in failed.items()}
+    results.update((transaction['transaction_id'], 'settled') for transaction in settled)
+    return results
+
+
+def worker(queue, lock, outcomes, batch):
+    conn = connect()
+    settle = settle_batch if batch > 1 else settle_one
+    try:
+        while True:
+            with lock:
+                if not queue:
+                    return
+                taken = queue[-batch:]
+                del queue[-batch:]
+                # A batch holds each id once; a duplicate goes back for another worker
+                transaction_ids = list(dict.fromkeys(taken))
+                queue[:0] = [t for t in transaction_ids if taken.count(t) > 1]
+            try:
+                results = settle(conn, transaction_ids)
+            except mysql.connector.Error as e:
+                results = dict.fromkeys(transaction_ids, f"database error {e.errno}")
+            with lock:
+                for transaction_id, outcome in results.items():
+                    outcomes[transaction_id].append(outcome)
+    finally:
+        conn.close()
+
+
+def check(settle_counts):
+    conn = connect()
+    cursor = conn.cursor(dictionary=True)
+    problems = []
+
+    cursor.execute("SELECT account_id FROM accounts")
+    balances = ledger.account_balances(cursor, [row['account_id'] for row in cursor.fetchall()])
+    expected_total = OPENING_BALANCE * len(balances)
+    if sum(balances.values()) != expected_total:
+        problems.append(f"Total balance {sum(balances.values())} != {expected_total}")
+    for account_id, balance in balances.items():
+        if balance < 0:
+            problems.append(f"Account {account_id} is negative: {balance}")
+
+    cursor.execute("SELECT transaction_id, source_account_id, destination_account_id, amount, status FROM transactions")
+    expected = dict.fromkeys(balances, OPENING_BALANCE)
+    for row in cursor.fetchall():
+        settled = settle_counts.get(row['transaction_id'], 0)
+        if row['status'] == 'completed':
+            if settled != 1:
+                problems.append(f"Transaction {row['transaction_id']} completed but settled {settled} times")
+            expected[row['source_account_id']] -= row['amount']
+            expected[row['destination_account_id']] += row['amount']
+        elif settled:
+            problems.append(f"Transaction {row['transaction_id']} is {row['status']} but was settled")
+    for account_id, balance in balances.items():
+        if balance != expected[account_id]:
+            problems.append(f"Account {account_id} balance {balance} != ledger {expected[account_id]}")
+
+    plain = conn.cursor()
+    problems.extend(ledger.verify(plain))
+    plain.close()
+    cursor.close()
+    conn.close()
+    return balances, problems
+
+
+def main():
+    transaction_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    batch = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+
+    transaction_ids = prepare(transaction_count)
+    queue = transaction_ids * 2
+    random.Random(11).shuffle(queue)
+    lock = threading.Lock()
+    outcomes = {transaction_id: [] for transaction_id in transaction_ids}
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(queue, lock, outcomes, batch)) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    summary = Counter(
+        'already settled' if outcome.startswith('Transaction is already') else outcome
+        for results in outcomes.values() for outcome in results
+    )
+    settle_counts = {transaction_id: results.count('settled') for transaction_id, results in outcomes.items()}
+    balances, problems = check(settle_counts)
+    problems.extend(
+        f"{count} settlements failed with {outcome}"
+        for outcome, count in summary.items()
+        if outcome not in ('settled', 'already settled', 'Insufficient funds')
+    )
+
+    attempts = len(transaction_ids) * 2
+    print(f"{attempts} settlement attempts from {threads} threads in {elapsed:.2f}s "
+          f"({attempts / elapsed:.0f}/s)")
+    for outcome, count in summary.most_common():
+        print(f"  {outcome:<20} {count}")
+    print(f"Hot account balance: {balances[HOT_ACCOUNT]}")
+
+    if problems:
+        print("\nFAILED")
+        for problem in problems:
+            print(f"  {problem}")
+        sys.exit(1)
+    print("\nOK: all invariants hold")
+
+
+if __name__ == "__main__":
+    main()
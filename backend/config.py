@@ -17,6 +17,13 @@ DB_USER = os.getenv('DB_USER', 'root')
 DB_PASSWORD = os.getenv('DB_PASSWORD', 'joniwhfe')
 DB_NAME = os.getenv('DB_NAME', 'fintech_app')
 
+# Connection pool settings
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))  # Connections kept open while idle
+DB_POOL_MAX_OVERFLOW = int(os.getenv('DB_POOL_MAX_OVERFLOW', '10'))  # Extra connections allowed under load
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '3600'))  # Max connection lifetime in seconds
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'True').lower() in ('true', '1', 't')
+
 # Authentication settings
 JWT_EXPIRATION_HOURS = int(os.getenv('JWT_EXPIRATION_HOURS', '24'))
 MFA_ISSUER_NAME = os.getenv('MFA_ISSUER_NAME', 'ExpenseShare HK')
@@ -27,12 +34,50 @@ TRANSACTION_TYPES = ['Transfer', 'Withdrawal', 'Deposit']
 DEFAULT_CURRENCY = os.getenv('DEFAULT_CURRENCY', 'HKD')
 MAX_TRANSACTION_AMOUNT = float(os.getenv('MAX_TRANSACTION_AMOUNT', '1000000'))
 REQUIRE_MFA_THRESHOLD = float(os.getenv('REQUIRE_MFA_THRESHOLD', '0'))  # Amount above which MFA is required
+MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', '100'))  # Transactions accepted by one batch request
+SETTLEMENT_MAX_RETRIES = int(os.getenv('SETTLEMENT_MAX_RETRIES', '3'))  # Reruns of a settlement after a deadlock or lock wait timeout
+SETTLEMENT_RETRY_BACKOFF = float(os.getenv('SETTLEMENT_RETRY_BACKOFF', '0.05'))  # Base backoff in seconds between those reruns
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', '86400'))  # Seconds an Idempotency-Key and its response are kept
+IDEMPOTENCY_CACHE_MAX_ENTRIES = int(os.getenv('IDEMPOTENCY_CACHE_MAX_ENTRIES', '4096'))  # In-process LRU of stored responses
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv('IDEMPOTENCY_LOCK_TIMEOUT', '60'))  # Seconds before an unfinished claim can be taken over
+HISTORY_DEFAULT_LIMIT = int(os.getenv('HISTORY_DEFAULT_LIMIT', '50'))  # Transactions per history page
+HISTORY_MAX_LIMIT = int(os.getenv('HISTORY_MAX_LIMIT', '500'))  # Largest page a client may request
+HISTORY_STREAM_BATCH = int(os.getenv('HISTORY_STREAM_BATCH', '1000'))  # Rows fetched per round-trip when streaming
+EXPORT_PARQUET_ROW_GROUP = int(os.getenv('EXPORT_PARQUET_ROW_GROUP', '50000'))  # Rows per Parquet row group in exports
+LEDGER_SNAPSHOT_MIN_TAIL = int(os.getenv('LEDGER_SNAPSHOT_MIN_TAIL', '100'))  # Ledger entries after the last snapshot before a new one is taken
+LEDGER_COMPACT_BATCH = int(os.getenv('LEDGER_COMPACT_BATCH', '500'))  # Accounts snapshotted per compaction round
+DAILY_TOTALS_ROLLUP_BATCH = int(os.getenv('DAILY_TOTALS_ROLLUP_BATCH', '5000'))  # Ledger entries folded into daily totals per round
+SUMMARY_MAX_DAYS = int(os.getenv('SUMMARY_MAX_DAYS', '3660'))  # Longest date range /summary accepts
+PENDING_TRANSACTION_TTL = int(os.getenv('PENDING_TRANSACTION_TTL', '900'))  # Seconds a transaction may wait for MFA before it expires
+PENDING_SWEEP_BATCH = int(os.getenv('PENDING_SWEEP_BATCH', '1000'))  # Rows expired or purged per statement by the sweeper
+EXPIRED_TRANSACTION_RETENTION_DAYS = int(os.getenv('EXPIRED_TRANSACTION_RETENTION_DAYS', '30'))  # Days expired rows are kept; 0 keeps them forever
+TRANSACTIONS_PARTITIONED = os.getenv('TRANSACTIONS_PARTITIONED', 'False').lower() in ('true', '1', 't')  # Partition transactions by month on transaction_date
+PARTITION_MONTHS_AHEAD = int(os.getenv('PARTITION_MONTHS_AHEAD', '3'))  # Empty future monthly partitions kept ready
+PARTITION_MIGRATION_CHUNK = int(os.getenv('PARTITION_MIGRATION_CHUNK', '10000'))  # Rows copied per statement when migrating
+PARTITION_MIGRATION_PAUSE = float(os.getenv('PARTITION_MIGRATION_PAUSE', '0.05'))  # Seconds to pause between copied chunks
 
 # AI integration settings
 OLLAMA_API_URL = os.getenv('OLLAMA_API_URL', 'http://localhost:11434/api/generate')
 OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'llama3.2')
+OLLAMA_KEEP_ALIVE = os.getenv('OLLAMA_KEEP_ALIVE', '30m')  # How long Ollama keeps the model loaded
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv('OLLAMA_CONNECT_TIMEOUT', '3.05'))  # Seconds to establish a connection
+OLLAMA_READ_TIMEOUT = float(os.getenv('OLLAMA_READ_TIMEOUT', '120'))  # Seconds to wait for the completion
+OLLAMA_MAX_RETRIES = int(os.getenv('OLLAMA_MAX_RETRIES', '2'))  # Retries on connection errors and 502/503/504
+OLLAMA_RETRY_BACKOFF = float(os.getenv('OLLAMA_RETRY_BACKOFF', '0.5'))  # Exponential backoff factor in seconds
+OLLAMA_POOL_MAXSIZE = int(os.getenv('OLLAMA_POOL_MAXSIZE', '10'))  # Keep-alive connections kept to Ollama
 AI_MAX_TOKENS = int(os.getenv('AI_MAX_TOKENS', '2048'))
 AI_TEMPERATURE = float(os.getenv('AI_TEMPERATURE', '0.7'))
+AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL', '300'))  # Seconds a cached chat answer stays valid
+AI_CACHE_MAX_ENTRIES = int(os.getenv('AI_CACHE_MAX_ENTRIES', '1024'))  # LRU capacity, 0 disables the cache
+AI_CONTEXT_MAX_TRANSACTIONS = int(os.getenv('AI_CONTEXT_MAX_TRANSACTIONS', '10'))  # Recent transactions in AI context
+AI_CONTEXT_TOKEN_BUDGET = int(os.getenv('AI_CONTEXT_TOKEN_BUDGET', '1000'))  # Approximate token limit for AI context
+# The expiry sweeper runs in its own process and cannot reach the in-memory AI
+# caches, so a transaction it expires or purges may still appear as pending to
+# the assistant until the snapshot is reloaded: AI_CONTEXT_TTL bounds that
+# staleness (cached answers are keyed on the context, so they follow it)
+AI_CONTEXT_TTL = int(os.getenv('AI_CONTEXT_TTL', '300'))  # Seconds before a cached context snapshot is reloaded
+AI_TREND_WINDOW_MONTHS = int(os.getenv('AI_TREND_WINDOW_MONTHS', '6'))  # Months used for spending trend slopes
+AI_TREND_THRESHOLD = float(os.getenv('AI_TREND_THRESHOLD', '0.05'))  # Relative monthly change that counts as a trend
 
 # API endpoints
 API_PREFIX = '/api'
@@ -55,6 +100,11 @@ LOG_FILE = os.getenv('LOG_FILE', 'app.log')
 USERS_TABLE = 'users'
 ACCOUNTS_TABLE = 'accounts'
 TRANSACTIONS_TABLE = 'transactions'
+IDEMPOTENCY_KEYS_TABLE = 'idempotency_keys'
+LEDGER_ENTRIES_TABLE = 'ledger_entries'
+BALANCE_SNAPSHOTS_TABLE = 'balance_snapshots'
+ACCOUNT_DAILY_TOTALS_TABLE = 'account_daily_totals'
+DAILY_TOTALS_WATERMARK_TABLE = 'daily_totals_watermark'
 
 # Database schema
 DB_SCHEMA = {
@@ -72,6 +122,8 @@ DB_SCHEMA = {
         )
     """,
 
+    # balance is the opening balance; live balances come from the ledger
+    # (see database/ledger.py)
     ACCOUNTS_TABLE: """
         CREATE TABLE IF NOT EXISTS accounts (
             account_id INT AUTO_INCREMENT PRIMARY KEY,
@@ -100,9 +152,89 @@ DB_SCHEMA = {
             FOREIGN KEY (source_account_id) REFERENCES accounts(account_id),
             FOREIGN KEY (destination_account_id) REFERENCES accounts(account_id)
         )
+    """,
+
+    IDEMPOTENCY_KEYS_TABLE: """
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            user_id INT NOT NULL,
+            endpoint VARCHAR(50) NOT NULL,
+            idempotency_key VARCHAR(255) NOT NULL,
+            request_hash CHAR(64) NOT NULL,
+            status_code SMALLINT NULL,
+            response_body MEDIUMTEXT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (user_id, endpoint, idempotency_key),
+            INDEX idx_idempotency_keys_expires (expires_at),
+            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+        )
+    """,
+
+    # Insert-only double-entry ledger. Every settled transaction writes
+    # entries that sum to zero; account_id NULL stands for money entering or
+    # leaving the bank (deposits, withdrawals, opening balances).
+    LEDGER_ENTRIES_TABLE: """
+        CREATE TABLE IF NOT EXISTS ledger_entries (
+            entry_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            transaction_id INT NULL,
+            account_id INT NULL,
+            amount DECIMAL(15,2) NOT NULL,
+            entry_type VARCHAR(20) NOT NULL,
+            created_at TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP(6),
+            INDEX idx_ledger_entries_account (account_id, entry_id),
+            FOREIGN KEY (transaction_id) REFERENCES transactions(transaction_id),
+            FOREIGN KEY (account_id) REFERENCES accounts(account_id)
+        )
+    """,
+
+    # Balance of an account after all of its entries up to entry_id.
+    # taken_at is the newest created_at among those entries.
+    BALANCE_SNAPSHOTS_TABLE: """
+        CREATE TABLE IF NOT EXISTS balance_snapshots (
+            account_id INT NOT NULL,
+            entry_id BIGINT NOT NULL,
+            balance DECIMAL(15,2) NOT NULL,
+            taken_at TIMESTAMP(6) NOT NULL,
+            PRIMARY KEY (account_id, entry_id),
+            INDEX idx_balance_snapshots_taken (account_id, taken_at),
+            FOREIGN KEY (account_id) REFERENCES accounts(account_id)
+        )
+    """,
+
+    # Completed money movement per account, day and transaction type,
+    # rolled up from the ledger; see database/daily_totals.py
+    ACCOUNT_DAILY_TOTALS_TABLE: """
+        CREATE TABLE IF NOT EXISTS account_daily_totals (
+            account_id INT NOT NULL,
+            day DATE NOT NULL,
+            transaction_type VARCHAR(50) NOT NULL,
+            inflow DECIMAL(15,2) NOT NULL DEFAULT 0,
+            outflow DECIMAL(15,2) NOT NULL DEFAULT 0,
+            inflow_count INT NOT NULL DEFAULT 0,
+            outflow_count INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (account_id, day, transaction_type),
+            FOREIGN KEY (account_id) REFERENCES accounts(account_id)
+        )
+    """,
+
+    # Last ledger entry folded into account_daily_totals (a single row, id 1)
+    DAILY_TOTALS_WATERMARK_TABLE: """
+        CREATE TABLE IF NOT EXISTS daily_totals_watermark (
+            id TINYINT PRIMARY KEY,
+            entry_id BIGINT NOT NULL
+        )
     """
 }
 
+# Secondary indexes, created by database/db_setup.py on new and existing databases.
+# History walks each account's transactions in (transaction_date, transaction_id)
+# order, so both sides of a transfer get an index in that order.
+DB_INDEXES = {
+    'idx_transactions_source_date': (TRANSACTIONS_TABLE, ['source_account_id', 'transaction_date', 'transaction_id']),
+    'idx_transactions_destination_date': (TRANSACTIONS_TABLE, ['destination_account_id', 'transaction_date', 'transaction_id']),
+    'idx_transactions_status_date': (TRANSACTIONS_TABLE, ['status', 'transaction_date']),
+}
+
 # Account types
 ACCOUNT_TYPES = ['Checking', 'Savings', 'Investment', 'Credit Card']
 
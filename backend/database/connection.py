@@ -0,0 +1,293 @@
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+from mysql.connector.errors import InterfaceError, OperationalError, PoolError
+
+import config
+
+
+class PoolTimeoutError(PoolError):
+    """Raised when no connection could be checked out before the pool timeout"""
+
+
+class PooledConnection:
+    """
+    Thin proxy around a MySQL connection borrowed from a ConnectionPool.
+
+    Everything is delegated to the underlying connection except close(),
+    which hands the connection back to the pool instead of dropping the
+    socket. Calling close() more than once is harmless.
+    """
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def is_connected(self):
+        if self._released:
+            return False
+        return self._raw.is_connected()
+
+    def close(self):
+        if self._released:
+            return
+        self._released = True
+        self._pool._release(self._raw, self._created_at)
+
+    def invalidate(self):
+        """Drop a broken connection instead of returning it to the pool"""
+        if self._released:
+            return
+        self._released = True
+        self._pool._release(self._raw, self._created_at, discard=True)
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of MySQL connections.
+
+    Args:
+        pool_size (int): Connections kept open while idle
+        max_overflow (int): Extra connections allowed under burst load; these are
+            closed as soon as they are returned
+        timeout (float): Seconds to wait for a free connection before failing
+        recycle (int): Maximum connection lifetime in seconds (0 disables)
+        pre_ping (bool): Ping idle connections on checkout and replace dead ones
+        **connect_args: Passed through to mysql.connector.connect()
+    """
+
+    def __init__(self, pool_size=5, max_overflow=10, timeout=30.0, recycle=3600,
+                 pre_ping=True, **connect_args):
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self._connect_args = connect_args
+
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'connects': 0,
+            'discards': 0,
+            'ping_failures': 0,
+            'max_wait_ms': 0.0,
+        }
+
+    def _expired(self, created_at):
+        return self.recycle > 0 and time.monotonic() - created_at > self.recycle
+
+    def _open(self):
+        raw = mysql.connector.connect(**self._connect_args)
+        with self._cond:
+            self._stats['connects'] += 1
+        return raw, time.monotonic()
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except mysql.connector.Error:
+            pass
+
+    def _healthy(self, raw):
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except mysql.connector.Error:
+            return False
+
+    def connect(self):
+        """
+        Check out a connection, waiting up to `timeout` seconds if the pool is exhausted.
+
+        Returns:
+            PooledConnection: Connection proxy; call close() to return it to the pool
+        """
+        started = time.monotonic()
+        deadline = started + self.timeout
+        stale = []
+        raw = None
+        created_at = None
+        waited = False
+
+        with self._cond:
+            while True:
+                while self._idle:
+                    candidate, candidate_created = self._idle.pop()
+                    if self._expired(candidate_created):
+                        stale.append(candidate)
+                        self._size -= 1
+                        continue
+                    raw, created_at = candidate, candidate_created
+                    break
+
+                if raw is not None or self._size < self.pool_size + self.max_overflow:
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                waited = True
+                self._cond.wait(remaining)
+
+            if raw is None and self._size < self.pool_size + self.max_overflow:
+                # Reserve a slot before connecting outside the lock
+                self._size += 1
+                reserved = True
+            else:
+                reserved = False
+
+            self._stats['discards'] += len(stale)
+            if raw is None and not reserved:
+                self._stats['timeouts'] += 1
+            else:
+                self._in_use += 1
+                self._stats['checkouts'] += 1
+                if waited:
+                    self._stats['waits'] += 1
+                wait_ms = (time.monotonic() - started) * 1000
+                self._stats['max_wait_ms'] = max(self._stats['max_wait_ms'], wait_ms)
+
+        for conn in stale:
+            self._discard(conn)
+
+        if raw is None and not reserved:
+            raise PoolTimeoutError(
+                f"No database connection available within {self.timeout} seconds"
+            )
+
+        if raw is not None and self.pre_ping and not self._healthy(raw):
+            with self._cond:
+                self._stats['ping_failures'] += 1
+                self._stats['discards'] += 1
+            self._discard(raw)
+            raw = None
+
+        if raw is None:
+            try:
+                raw, created_at = self._open()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+
+        return PooledConnection(self, raw, created_at)
+
+    def _release(self, raw, created_at, discard=False):
+        """Return a connection to the idle set, or close it if it is surplus, expired or broken"""
+        keep = not discard and not self._expired(created_at)
+        if keep:
+            try:
+                # Never hand the next borrower an open transaction
+                if raw.in_transaction:
+                    raw.rollback()
+            except mysql.connector.Error:
+                keep = False
+
+        with self._cond:
+            self._in_use -= 1
+            if keep and len(self._idle) < self.pool_size:
+                self._idle.append((raw, created_at))
+                raw = None
+            else:
+                self._size -= 1
+                self._stats['discards'] += 1
+            self._cond.notify()
+
+        if raw is not None:
+            self._discard(raw)
+
+    def stats(self):
+        """Return a snapshot of pool counters for sizing and monitoring"""
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot.update({
+                'pool_size': self.pool_size,
+                'max_overflow': self.max_overflow,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'overflow': max(0, self._size - self.pool_size),
+            })
+        return snapshot
+
+    def dispose(self):
+        """Close every idle connection; checked-out connections close when returned"""
+        with self._cond:
+            idle = [raw for raw, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+        for raw in idle:
+            self._discard(raw)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    pool_size=config.DB_POOL_SIZE,
+                    max_overflow=config.DB_POOL_MAX_OVERFLOW,
+                    timeout=config.DB_POOL_TIMEOUT,
+                    recycle=config.DB_POOL_RECYCLE,
+                    pre_ping=config.DB_POOL_PRE_PING,
+                    host=config.DB_HOST,
+                    user=config.DB_USER,
+                    password=config.DB_PASSWORD,
+                    database=config.DB_NAME
+                )
+    return _pool
+
+
+def get_db_connection():
+    """Borrow a connection from the shared pool; close() returns it"""
+    return get_pool().connect()
+
+
+def get_pool_stats():
+    """Pool counters (checkouts, waits, timeouts, ...) for the health endpoint"""
+    return get_pool().stats()
+
+
+def run_query(work):
+    """
+    Run work(cursor) on a pooled connection and return its result.
+
+    If the connection turns out to be dead (server restart, wait_timeout),
+    it is dropped and the work is retried once on a fresh connection, so
+    work should be read-only or otherwise safe to repeat.
+    """
+    for attempt in range(2):
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor(dictionary=True, buffered=True)
+            try:
+                return work(cursor)
+            finally:
+                cursor.close()
+        except (InterfaceError, OperationalError):
+            conn.invalidate()
+            if attempt:
+                raise
+        finally:
+            conn.close()
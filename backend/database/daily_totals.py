@@ -0,0 +1,269 @@
+"""
+Per-account daily totals of completed transactions.
+
+account_daily_totals holds one row per (account_id, day, transaction_type)
+with the money that came in and went out and how many transactions moved
+it. The rows are rolled up from the ledger rather than written by
+settlement, so settling into a hot account never waits on a totals row:
+roll_up() folds the ledger entries after a watermark into the totals and
+advances the watermark in the same transaction. Summaries read the rolled
+up rows plus the short ledger tail after the watermark, so they are exact
+and cost O(days in range + tail) rather than O(transactions).
+
+The day is the day of transaction_date, the same date history filters on.
+A transfer between two of a user's own accounts counts as outflow on one
+and inflow on the other.
+
+Run from the backend directory:
+
+    python -m database.daily_totals rebuild          # once, while nothing is being settled
+    python -m database.daily_totals rollup [seconds]
+
+With a number of seconds, rollup keeps running and rolls up again after
+each pause.
+"""
+import datetime
+import decimal
+import sys
+import time
+
+import config
+
+ZERO = decimal.Decimal('0.00')
+
+UPSERT_TOTALS = """
+    ON DUPLICATE KEY UPDATE
+        inflow = inflow + VALUES(inflow),
+        outflow = outflow + VALUES(outflow),
+        inflow_count = inflow_count + VALUES(inflow_count),
+        outflow_count = outflow_count + VALUES(outflow_count)
+"""
+
+WATERMARK_SQL = "COALESCE((SELECT entry_id FROM daily_totals_watermark WHERE id = 1), 0)"
+
+
+def roll_up(conn, batch=None):
+    """
+    Fold settled ledger entries past the watermark into the daily totals.
+
+    The entries are read with a locking read, so one whose settlement is
+    still being committed is waited for rather than skipped: the watermark
+    moves past its id, and summaries only read the tail after the
+    watermark. Safe to run from several processes: the watermark row is
+    locked while a batch is applied.
+
+    Returns:
+        int: Number of ledger entries rolled up
+    """
+    batch = config.DAILY_TOTALS_ROLLUP_BATCH if batch is None else batch
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute("INSERT IGNORE INTO daily_totals_watermark (id, entry_id) VALUES (1, 0)")
+        cursor.execute("SELECT entry_id FROM daily_totals_watermark WHERE id = 1 FOR UPDATE")
+        watermark = cursor.fetchone()[0]
+        cursor.execute(
+            """
+            SELECT MAX(entry_id) FROM (
+                SELECT entry_id FROM ledger_entries WHERE entry_id > %s ORDER BY entry_id LIMIT %s
+            ) pending
+            """,
+            (watermark, batch)
+        )
+        upper = cursor.fetchone()[0]
+        if upper is None:
+            conn.commit()
+            return 0
+
+        # Locking reads see the entries committed while they waited, which
+        # the transaction's consistent snapshot would not
+        cursor.execute(
+            "SELECT COUNT(*) FROM ledger_entries WHERE entry_id > %s AND entry_id <= %s LOCK IN SHARE MODE",
+            (watermark, upper)
+        )
+        rolled = cursor.fetchone()[0]
+        cursor.execute(
+            """
+            SELECT e.account_id, DATE(t.transaction_date), t.transaction_type,
+                   SUM(IF(e.amount > 0, e.amount, 0)), SUM(IF(e.amount < 0, -e.amount, 0)),
+                   SUM(e.amount > 0), SUM(e.amount < 0)
+            FROM ledger_entries e
+            JOIN transactions t ON t.transaction_id = e.transaction_id
+            WHERE e.entry_id > %s AND e.entry_id <= %s AND e.account_id IS NOT NULL
+            GROUP BY e.account_id, DATE(t.transaction_date), t.transaction_type
+            LOCK IN SHARE MODE
+            """,
+            (watermark, upper)
+        )
+        totals = cursor.fetchall()
+        if totals:
+            cursor.executemany(
+                f"""
+                INSERT INTO account_daily_totals
+                    (account_id, day, transaction_type, inflow, outflow, inflow_count, outflow_count)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                {UPSERT_TOTALS}
+                """,
+                totals
+            )
+        cursor.execute("UPDATE daily_totals_watermark SET entry_id = %s WHERE id = 1", (upper,))
+        conn.commit()
+        return rolled
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def summarize(cursor, account_ids, date_from, date_to, period='day'):
+    """
+    Totals of the given accounts between two dates, both inclusive.
+
+    The rolled-up rows and the ledger tail after the watermark are read by
+    one statement, so they come from the same consistent snapshot.
+
+    Args:
+        cursor: A dictionary cursor
+        account_ids (list): Accounts to include
+        date_from (datetime.date): First day
+        date_to (datetime.date): Last day
+        period (str): 'day' or 'month', the granularity of the series
+
+    Returns:
+        dict: 'totals' (inflow, outflow, net and counts over the whole range),
+            'by_type' (the same per transaction_type) and 'series' (the same
+            per day or month, oldest first)
+    """
+    if not account_ids:
+        return {'totals': _finish(_totals()), 'by_type': {}, 'series': []}
+
+    # %% because the query goes through parameter substitution
+    bucket = "'%%Y-%%m'" if period == 'month' else "'%%Y-%%m-%%d'"
+    placeholders = ', '.join(['%s'] * len(account_ids))
+    cursor.execute(
+        f"""
+        SELECT period, transaction_type,
+               SUM(inflow) AS inflow, SUM(outflow) AS outflow,
+               SUM(inflow_count) AS inflow_count, SUM(outflow_count) AS outflow_count
+        FROM (
+            SELECT DATE_FORMAT(day, {bucket}) AS period, transaction_type,
+                   inflow, outflow, inflow_count, outflow_count
+            FROM account_daily_totals
+            WHERE account_id IN ({placeholders}) AND day >= %s AND day <= %s
+            UNION ALL
+            SELECT DATE_FORMAT(t.transaction_date, {bucket}), t.transaction_type,
+                   IF(e.amount > 0, e.amount, 0), IF(e.amount < 0, -e.amount, 0),
+                   e.amount > 0, e.amount < 0
+            FROM ledger_entries e
+            JOIN transactions t ON t.transaction_id = e.transaction_id
+            WHERE e.account_id IN ({placeholders}) AND e.entry_id > {WATERMARK_SQL}
+              AND t.transaction_date >= %s AND t.transaction_date < %s
+        ) combined
+        GROUP BY period, transaction_type
+        ORDER BY period
+        """,
+        [*account_ids, date_from, date_to,
+         *account_ids, date_from, date_to + datetime.timedelta(days=1)]
+    )
+
+    totals = _totals()
+    by_type = {}
+    series = {}
+    for row in cursor.fetchall():
+        for target in (totals,
+                       by_type.setdefault(row['transaction_type'], _totals()),
+                       series.setdefault(row['period'], _totals())):
+            target['inflow'] += row['inflow']
+            target['outflow'] += row['outflow']
+            target['inflow_count'] += int(row['inflow_count'])
+            target['outflow_count'] += int(row['outflow_count'])
+
+    return {
+        'totals': _finish(totals),
+        'by_type': {transaction_type: _finish(values) for transaction_type, values in by_type.items()},
+        'series': [dict(_finish(values), period=period) for period, values in series.items()],
+    }
+
+
+def _totals():
+    return {'inflow': ZERO, 'outflow': ZERO, 'inflow_count': 0, 'outflow_count': 0}
+
+
+def _finish(values):
+    """Add net and send amounts as exact decimal strings"""
+    return {
+        'inflow': str(values['inflow']),
+        'outflow': str(values['outflow']),
+        'net': str(values['inflow'] - values['outflow']),
+        'inflow_count': values['inflow_count'],
+        'outflow_count': values['outflow_count'],
+    }
+
+
+def rebuild(cursor):
+    """
+    Recompute every daily total from the completed transactions and move
+    the watermark to the end of the ledger.
+
+    Returns:
+        int: Affected row count as MySQL reports it
+    """
+    cursor.execute("DELETE FROM account_daily_totals")
+    written = 0
+    # Incoming side, then outgoing side
+    sides = (('destination_account_id', "SUM(amount), 0, COUNT(*), 0"),
+             ('source_account_id', "0, SUM(amount), 0, COUNT(*)"))
+    for account_column, amounts in sides:
+        cursor.execute(
+            f"""
+            INSERT INTO account_daily_totals
+                (account_id, day, transaction_type, inflow, outflow, inflow_count, outflow_count)
+            SELECT {account_column}, DATE(transaction_date), transaction_type, {amounts}
+            FROM transactions
+            WHERE status = 'completed' AND {account_column} IS NOT NULL
+            GROUP BY {account_column}, DATE(transaction_date), transaction_type
+            {UPSERT_TOTALS}
+            """
+        )
+        written += cursor.rowcount
+    cursor.execute(
+        """
+        INSERT INTO daily_totals_watermark (id, entry_id)
+        SELECT 1, COALESCE(MAX(entry_id), 0) FROM ledger_entries
+        ON DUPLICATE KEY UPDATE entry_id = VALUES(entry_id)
+        """
+    )
+    return written
+
+
+def main():
+    from database.connection import get_db_connection
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'rollup'
+    conn = get_db_connection()
+    try:
+        if command == 'rebuild':
+            cursor = conn.cursor()
+            written = rebuild(cursor)
+            conn.commit()
+            cursor.close()
+            print(f"Rebuilt daily totals ({written} rows affected)")
+        elif command == 'rollup':
+            interval = float(sys.argv[2]) if len(sys.argv) > 2 else 0
+            while True:
+                rolled = roll_up(conn)
+                print(f"{datetime.datetime.now():%Y-%m-%d %H:%M:%S} rolled up {rolled} ledger entries")
+                if not interval:
+                    break
+                # Keep going straight away while a full batch was needed
+                if rolled < config.DAILY_TOTALS_ROLLUP_BATCH:
+                    time.sleep(interval)
+        else:
+            sys.exit(f"Unknown command '{command}'. Use rebuild or rollup.")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 import mysql.connector
 from mysql.connector import Error
 import config
+from database.ledger import backfill_opening_entries
+from database.partitioning import migrate
 
 
 def create_database():
@@ -24,6 +26,25 @@ def create_database():
             conn.close()
 
 
+def create_indexes(cursor, database=None):
+    """Create the secondary indexes defined in config that do not exist yet"""
+    database = database or config.DB_NAME
+    for index_name, (table_name, columns) in config.DB_INDEXES.items():
+        # MySQL has no CREATE INDEX IF NOT EXISTS
+        cursor.execute(
+            """
+            SELECT COUNT(*) FROM information_schema.statistics
+            WHERE table_schema = %s AND table_name = %s AND index_name = %s
+            """,
+            (database, table_name, index_name)
+        )
+        if cursor.fetchone()[0]:
+            print(f"Index '{index_name}' already exists")
+            continue
+        cursor.execute(f"CREATE INDEX {index_name} ON {table_name} ({', '.join(columns)})")
+        print(f"Index '{index_name}' created on '{table_name}'")
+
+
 def create_tables():
     """Create all required tables using schema defined in config"""
     conn = None
@@ -43,7 +64,21 @@ def create_tables():
                 cursor.execute(schema)
                 print(f"Table '{table_name}' created or already exists")
 
-    except Error as e:
+            create_indexes(cursor)
+
+            # Balances come from the ledger, so existing accounts need their
+            # opening entries before anything settles against them
+            written = backfill_opening_entries(cursor)
+            conn.commit()
+            if written:
+                print(f"Wrote {written} opening ledger entries")
+
+            # On a new database the table is still empty and is partitioned
+            # in place; a populated one is copied over online
+            if config.TRANSACTIONS_PARTITIONED and migrate(conn):
+                print(f"Table '{config.TRANSACTIONS_TABLE}' partitioned by month")
+
+    except (Error, RuntimeError) as e:
         print(f"Error: {e}")
     finally:
         if conn and conn.is_connected():
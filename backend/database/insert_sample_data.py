@@ -10,6 +10,8 @@ import pyotp
 # Add the parent directory to the path to import config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 import config
+from database.daily_totals import rebuild as rebuild_daily_totals
+from database.ledger import backfill_opening_entries
 
 
 def get_db_connection():
@@ -280,6 +282,15 @@ def main():
     # Insert transactions between those accounts
     insert_sample_transactions(accounts)
 
+    # Open the ledger with the sample balances and total up the sample transactions
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    backfill_opening_entries(cursor)
+    rebuild_daily_totals(cursor)
+    conn.commit()
+    cursor.close()
+    conn.close()
+
     print("✅ Sample data insertion complete!")
 
     # Print test user credentials for easy login
@@ -0,0 +1,306 @@
+"""
+Double-entry ledger and balance snapshots.
+
+ledger_entries is insert-only: settling a transaction appends entries that
+sum to zero, and nothing is ever updated or deleted. The ledger is the
+source of truth for balances: the balance of an account is its latest
+snapshot plus the entries after it (the tail), so it can be computed as of
+any point in time at the cost of reading one tail. accounts.balance only
+holds the balance an account was opened with.
+
+Crediting an account is just an insert, so settlements into a hot account
+never wait on each other; only debits lock the source account row, to
+check funds. compact() keeps tails short by taking new snapshots; run it
+periodically:
+
+    python -m database.ledger backfill       # db_setup runs this too
+    python -m database.ledger compact [seconds]
+    python -m database.ledger verify
+
+(from the backend directory). With a number of seconds, compact keeps
+running and compacts again after each pause.
+"""
+import datetime
+import decimal
+import sys
+import time
+
+import config
+
+ZERO = decimal.Decimal('0.00')
+
+# Current balance of the accounts row aliased `a`: its latest snapshot plus
+# the ledger tail after it. Both parts are index range scans.
+BALANCE_SQL = """(
+    COALESCE((SELECT s.balance FROM balance_snapshots s WHERE s.account_id = a.account_id
+              ORDER BY s.entry_id DESC LIMIT 1), 0)
+    + (SELECT COALESCE(SUM(e.amount), 0) FROM ledger_entries e
+       WHERE e.account_id = a.account_id
+         AND e.entry_id > COALESCE((SELECT MAX(s.entry_id) FROM balance_snapshots s
+                                    WHERE s.account_id = a.account_id), 0))
+)"""
+
+
+def transaction_entries(transaction):
+    """
+    Ledger rows for one settled transaction.
+
+    Deposits and withdrawals have their other leg on account None, so the
+    entries of every transaction sum to zero.
+
+    Returns:
+        list: (transaction_id, account_id, amount, entry_type) tuples
+    """
+    amount = transaction['amount']
+    return [
+        (transaction['transaction_id'], transaction['source_account_id'], -amount, 'settlement'),
+        (transaction['transaction_id'], transaction['destination_account_id'], amount, 'settlement'),
+    ]
+
+
+def append_entries(cursor, transactions):
+    """Append the entries of settled transactions in one statement"""
+    rows = [row for transaction in transactions for row in transaction_entries(transaction)]
+    if rows:
+        cursor.executemany(
+            "INSERT INTO ledger_entries (transaction_id, account_id, amount, entry_type) VALUES (%s, %s, %s, %s)",
+            rows
+        )
+
+
+def append_opening_entries(cursor, account_id, balance):
+    """Record the balance a new account starts with"""
+    balance = decimal.Decimal(str(balance))
+    if balance:
+        cursor.executemany(
+            "INSERT INTO ledger_entries (transaction_id, account_id, amount, entry_type) VALUES (%s, %s, %s, %s)",
+            [(None, None, -balance, 'opening'), (None, account_id, balance, 'opening')]
+        )
+
+
+def account_balance(cursor, account_id, before=None):
+    """
+    Balance of an account from its latest snapshot plus the ledger tail.
+
+    Args:
+        cursor: A tuple cursor
+        account_id (int): The account
+        before (datetime.datetime, optional): Only count entries created
+            before this moment; defaults to all entries
+
+    Returns:
+        decimal.Decimal: The balance
+    """
+    time_filter = " AND taken_at < %s" if before else ""
+    cursor.execute(
+        f"SELECT entry_id, balance FROM balance_snapshots WHERE account_id = %s{time_filter} "
+        f"ORDER BY entry_id DESC LIMIT 1",
+        (account_id, before) if before else (account_id,)
+    )
+    snapshot = cursor.fetchone()
+    entry_id, balance = snapshot if snapshot else (0, ZERO)
+
+    time_filter = " AND created_at < %s" if before else ""
+    cursor.execute(
+        f"SELECT COALESCE(SUM(amount), 0) FROM ledger_entries "
+        f"WHERE account_id = %s AND entry_id > %s{time_filter}",
+        (account_id, entry_id, before) if before else (account_id, entry_id)
+    )
+    return balance + cursor.fetchone()[0]
+
+
+def account_balances(cursor, account_ids):
+    """
+    Current balances of several accounts with one query.
+
+    Runs a consistent read, so inside a transaction it sees what was
+    committed when the transaction's first plain SELECT ran.
+
+    Returns:
+        dict: account_id -> decimal.Decimal, for the accounts that exist
+    """
+    if not account_ids:
+        return {}
+    placeholders = ', '.join(['%s'] * len(account_ids))
+    cursor.execute(
+        f"SELECT a.account_id AS account_id, {BALANCE_SQL} AS balance FROM accounts a "
+        f"WHERE a.account_id IN ({placeholders})",
+        list(account_ids)
+    )
+    rows = cursor.fetchall()
+    return {
+        (row['account_id'] if isinstance(row, dict) else row[0]):
+            (row['balance'] if isinstance(row, dict) else row[1])
+        for row in rows
+    }
+
+
+def backfill_opening_entries(cursor):
+    """
+    Give every account that has no opening entry one for accounts.balance.
+
+    Settlement never updates accounts.balance, so it keeps holding the
+    balance an account had when the ledger was introduced, and an account
+    that was already credited through the ledger still gets its opening
+    entry. Accounts opened since have one already, so running this again
+    writes nothing.
+
+    Returns:
+        int: Number of entries written
+    """
+    missing = """
+        FROM accounts a
+        WHERE a.balance <> 0
+          AND NOT EXISTS (SELECT 1 FROM ledger_entries e
+                          WHERE e.account_id = a.account_id AND e.entry_type = 'opening')
+    """
+    cursor.execute(
+        f"""
+        INSERT INTO ledger_entries (transaction_id, account_id, amount, entry_type)
+        SELECT NULL, account_id, amount, 'opening' FROM (
+            SELECT NULL AS account_id, -a.balance AS amount {missing}
+            UNION ALL
+            SELECT a.account_id, a.balance {missing}
+        ) AS opening
+        """
+    )
+    return cursor.rowcount
+
+
+def compact(conn, min_tail=None, batch=None):
+    """
+    Take new snapshots for accounts whose tail has grown past min_tail.
+
+    The entries folded into a snapshot are summed with a locking read, so
+    an entry whose settlement is still being committed is waited for rather
+    than skipped: its id can be below the snapshot's entry_id, and the tail
+    after the snapshot would never count it. Each snapshot is committed on
+    its own so an account's tail is only locked briefly. Old snapshots are
+    kept for point-in-time queries. Safe to run from several processes.
+
+    Returns:
+        int: Number of snapshots taken
+    """
+    min_tail = config.LEDGER_SNAPSHOT_MIN_TAIL if min_tail is None else min_tail
+    batch = config.LEDGER_COMPACT_BATCH if batch is None else batch
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            SELECT e.account_id, COALESCE(s.entry_id, 0), MAX(e.entry_id)
+            FROM ledger_entries e
+            LEFT JOIN (
+                SELECT account_id, MAX(entry_id) AS entry_id FROM balance_snapshots GROUP BY account_id
+            ) s ON s.account_id = e.account_id
+            WHERE e.account_id IS NOT NULL
+              AND e.entry_id > COALESCE(s.entry_id, 0)
+            GROUP BY e.account_id, s.entry_id
+            HAVING COUNT(*) >= %s
+            LIMIT %s
+            """,
+            (min_tail, batch)
+        )
+        candidates = cursor.fetchall()
+        conn.commit()
+
+        for account_id, previous_entry, last_entry in candidates:
+            cursor.execute(
+                "SELECT balance FROM balance_snapshots WHERE account_id = %s AND entry_id = %s",
+                (account_id, previous_entry)
+            )
+            snapshot = cursor.fetchone()
+            # Locking read: waits for uncommitted entries in the range and
+            # then sees them, where a consistent read would leave them out
+            cursor.execute(
+                """
+                SELECT COALESCE(SUM(amount), 0), MAX(created_at) FROM ledger_entries
+                WHERE account_id = %s AND entry_id > %s AND entry_id <= %s
+                LOCK IN SHARE MODE
+                """,
+                (account_id, previous_entry, last_entry)
+            )
+            delta, taken_at = cursor.fetchone()
+            cursor.execute(
+                "INSERT IGNORE INTO balance_snapshots (account_id, entry_id, balance, taken_at) VALUES (%s, %s, %s, %s)",
+                (account_id, last_entry, (snapshot[0] if snapshot else ZERO) + delta, taken_at)
+            )
+            conn.commit()
+        return len(candidates)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def verify(cursor):
+    """
+    Check that the ledger balances and that snapshots agree with it.
+
+    Every account's balance from its latest snapshot plus tail must equal
+    the sum of all of its entries.
+
+    Returns:
+        list: Descriptions of every inconsistency found
+    """
+    problems = []
+    cursor.execute("SELECT COALESCE(SUM(amount), 0) FROM ledger_entries")
+    total = cursor.fetchone()[0]
+    if total != 0:
+        problems.append(f"Ledger entries sum to {total}, not 0")
+
+    cursor.execute(
+        """
+        SELECT a.account_id, COALESCE(SUM(e.amount), 0)
+        FROM accounts a LEFT JOIN ledger_entries e ON e.account_id = a.account_id
+        GROUP BY a.account_id
+        """
+    )
+    full_sums = dict(cursor.fetchall())
+    derived = account_balances(cursor, list(full_sums))
+    for account_id, full_sum in full_sums.items():
+        if derived[account_id] != full_sum:
+            problems.append(f"Account {account_id}: snapshot plus tail {derived[account_id]}, ledger {full_sum}")
+    return problems
+
+
+def main():
+    from database.connection import get_db_connection
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'compact'
+    conn = get_db_connection()
+    try:
+        if command == 'backfill':
+            cursor = conn.cursor()
+            written = backfill_opening_entries(cursor)
+            conn.commit()
+            cursor.close()
+            print(f"Wrote {written} opening entries")
+        elif command == 'compact':
+            interval = float(sys.argv[2]) if len(sys.argv) > 2 else 0
+            while True:
+                taken = compact(conn)
+                print(f"{datetime.datetime.now():%Y-%m-%d %H:%M:%S} took {taken} snapshots")
+                if not interval:
+                    break
+                # Keep going straight away while a full batch was needed
+                if taken < config.LEDGER_COMPACT_BATCH:
+                    time.sleep(interval)
+        elif command == 'verify':
+            cursor = conn.cursor()
+            problems = verify(cursor)
+            cursor.close()
+            for problem in problems:
+                print(problem)
+            print("OK: ledger balances and snapshots match it" if not problems else f"{len(problems)} problems")
+            if problems:
+                sys.exit(1)
+        else:
+            sys.exit(f"Unknown command '{command}'. Use backfill, compact or verify.")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+"""
+Monthly partitioning of the transactions table.
+
+With TRANSACTIONS_PARTITIONED set, transactions is RANGE partitioned on
+UNIX_TIMESTAMP(transaction_date), one partition per month plus a catch-all
+pmax. Queries with a date range (history filters, keyset cursors, the
+expiry sweeper) only touch the months they cover, and an old month can be
+archived by swapping its partition out for an empty table, which moves no
+rows.
+
+MySQL requires the partitioning column in every unique key and does not
+allow foreign keys on partitioned tables, so the partitioned table has
+PRIMARY KEY (transaction_id, transaction_date) and no foreign keys, and
+ledger_entries loses its foreign key to transactions. Month boundaries are
+taken in the session time zone of the connection that creates them.
+
+An existing table is converted online, in the manner of pt-online-schema-change:
+
+1. create an empty partitioned copy, transactions_partitioned,
+2. add triggers that mirror every insert, update and delete into it,
+3. copy the existing rows in primary key chunks, each read with a shared
+   lock so a concurrent update waits and is then mirrored by its trigger,
+4. swap the tables with one atomic RENAME TABLE.
+
+The old table is kept as transactions_unpartitioned until dropped by hand.
+An empty table, as on a new database, is simply altered in place, and an
+empty transactions_unpartitioned left behind by such a table is dropped.
+Usage (from the backend directory):
+
+    python -m database.partitioning migrate
+    python -m database.partitioning extend          # add upcoming months; run monthly
+    python -m database.partitioning archive 2019-03
+    python -m database.partitioning status
+"""
+import datetime
+import sys
+import time
+
+import config
+
+PARTITIONED_TABLE = 'transactions_partitioned'
+OLD_TABLE = 'transactions_unpartitioned'
+ARCHIVE_TABLE = 'transactions_archive_{month:%Y%m}'
+TRIGGERS = ('transactions_mirror_insert', 'transactions_mirror_update', 'transactions_mirror_delete')
+
+
+def month_start(value):
+    """First moment of the month containing value"""
+    return datetime.datetime(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    """The month `count` months after month (which must be a month start)"""
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"p{month:%Y%m}"
+
+
+def partition_definitions(first_month, last_month):
+    """
+    Partition clauses from first_month through last_month, plus pmax.
+
+    The first partition also takes every older row.
+    """
+    clauses = []
+    month = first_month
+    while month <= last_month:
+        clauses.append(
+            f"PARTITION {partition_name(month)} VALUES LESS THAN "
+            f"(UNIX_TIMESTAMP('{add_months(month, 1):%Y-%m-%d %H:%M:%S}'))"
+        )
+        month = add_months(month, 1)
+    clauses.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    return ",\n".join(clauses)
+
+
+def is_partitioned(cursor, table=None):
+    """True if the table in the current database is partitioned"""
+    cursor.execute(
+        """
+        SELECT COUNT(*) FROM information_schema.partitions
+        WHERE table_schema = DATABASE() AND table_name = %s AND partition_name IS NOT NULL
+        """,
+        (table or config.TRANSACTIONS_TABLE,)
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def table_exists(cursor, table):
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s",
+        (table,)
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def partitions(cursor):
+    """
+    Partitions of transactions in order.
+
+    Returns:
+        list: (partition_name, approximate_rows) tuples
+    """
+    cursor.execute(
+        """
+        SELECT partition_name, table_rows FROM information_schema.partitions
+        WHERE table_schema = DATABASE() AND table_name = %s AND partition_name IS NOT NULL
+        ORDER BY partition_ordinal_position
+        """,
+        (config.TRANSACTIONS_TABLE,)
+    )
+    return cursor.fetchall()
+
+
+def _columns(cursor):
+    cursor.execute(
+        """
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s
+        ORDER BY ordinal_position
+        """,
+        (config.TRANSACTIONS_TABLE,)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _drop_triggers(cursor):
+    for trigger in TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
+
+def is_empty(cursor, table):
+    cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {table})")
+    return not cursor.fetchone()[0]
+
+
+def _drop_foreign_keys(cursor, key_column):
+    """Drop the foreign keys whose key_column (table_name or referenced_table_name) is transactions"""
+    cursor.execute(
+        f"""
+        SELECT table_name, constraint_name FROM information_schema.referential_constraints
+        WHERE constraint_schema = DATABASE() AND {key_column} = %s
+        """,
+        (config.TRANSACTIONS_TABLE,)
+    )
+    for table, constraint in cursor.fetchall():
+        cursor.execute(f"ALTER TABLE {table} DROP FOREIGN KEY {constraint}")
+
+
+def _drop_referencing_foreign_keys(cursor):
+    """Drop foreign keys that point at transactions; they would block the swap"""
+    _drop_foreign_keys(cursor, 'referenced_table_name')
+
+
+def _partition(cursor, table, months_ahead):
+    """Give table the partitioned primary key and monthly partitions"""
+    # Rows are roughly in id order, so the oldest id gives the first month
+    # cheaply; anything older still lands in the first partition
+    cursor.execute(
+        f"SELECT transaction_date FROM {config.TRANSACTIONS_TABLE} ORDER BY transaction_id LIMIT 1"
+    )
+    oldest = cursor.fetchone()
+    now = month_start(datetime.datetime.now())
+    first_month = month_start(oldest[0]) if oldest and oldest[0] else now
+
+    cursor.execute(
+        f"""
+        ALTER TABLE {table}
+            MODIFY transaction_date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            DROP PRIMARY KEY,
+            ADD PRIMARY KEY (transaction_id, transaction_date)
+        PARTITION BY RANGE (UNIX_TIMESTAMP(transaction_date)) (
+            {partition_definitions(first_month, add_months(now, months_ahead))}
+        )
+        """
+    )
+
+
+def _create_partitioned_copy(cursor, months_ahead):
+    """Empty, partitioned table with the same columns and indexes as transactions"""
+    cursor.execute(f"DROP TABLE IF EXISTS {PARTITIONED_TABLE}")
+    cursor.execute(f"CREATE TABLE {PARTITIONED_TABLE} LIKE {config.TRANSACTIONS_TABLE}")
+    _partition(cursor, PARTITIONED_TABLE, months_ahead)
+
+
+def _partition_in_place(cursor, months_ahead):
+    """Partition an empty transactions table directly; there is nothing to copy"""
+    _drop_triggers(cursor)
+    _drop_referencing_foreign_keys(cursor)
+    # Partitioned tables cannot have foreign keys of their own either
+    _drop_foreign_keys(cursor, 'table_name')
+    cursor.execute(f"DROP TABLE IF EXISTS {PARTITIONED_TABLE}")
+    _partition(cursor, config.TRANSACTIONS_TABLE, months_ahead)
+
+
+def _create_triggers(cursor, columns):
+    column_list = ', '.join(columns)
+    new_values = ', '.join(f"NEW.{column}" for column in columns)
+    old_row = "transaction_id = OLD.transaction_id AND transaction_date = OLD.transaction_date"
+    cursor.execute(
+        f"""
+        CREATE TRIGGER {TRIGGERS[0]} AFTER INSERT ON {config.TRANSACTIONS_TABLE} FOR EACH ROW
+        REPLACE INTO {PARTITIONED_TABLE} ({column_list}) VALUES ({new_values})
+        """
+    )
+    cursor.execute(
+        f"""
+        CREATE TRIGGER {TRIGGERS[1]} AFTER UPDATE ON {config.TRANSACTIONS_TABLE} FOR EACH ROW
+        BEGIN
+            DELETE FROM {PARTITIONED_TABLE} WHERE {old_row};
+            REPLACE INTO {PARTITIONED_TABLE} ({column_list}) VALUES ({new_values});
+        END
+        """
+    )
+    cursor.execute(
+        f"""
+        CREATE TRIGGER {TRIGGERS[2]} AFTER DELETE ON {config.TRANSACTIONS_TABLE} FOR EACH ROW
+        DELETE FROM {PARTITIONED_TABLE} WHERE {old_row}
+        """
+    )
+
+
+def migrate(conn, chunk=None, pause=None, months_ahead=None, progress=None):
+    """
+    Convert transactions to the monthly partitioned layout while it stays in use.
+
+    Does nothing if the table is already partitioned, and partitions an
+    empty table in place without the copy. An interrupted run can simply be
+    started again; it rebuilds the copy from scratch.
+
+    Args:
+        conn: A connection to the application database
+        chunk (int): Rows copied per statement
+        pause (float): Seconds to sleep between chunks, to leave room for live traffic
+        months_ahead (int): Empty future months to create
+        progress (callable, optional): Called with (copied_up_to_id, max_id) after each chunk
+
+    Returns:
+        bool: True if the table was migrated, False if it already was partitioned
+
+    Raises:
+        RuntimeError: If a populated transactions_unpartitioned from an earlier
+            migration is still there
+    """
+    chunk = config.PARTITION_MIGRATION_CHUNK if chunk is None else chunk
+    pause = config.PARTITION_MIGRATION_PAUSE if pause is None else pause
+    months_ahead = config.PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+
+    cursor = conn.cursor()
+    try:
+        if is_partitioned(cursor):
+            return False
+        if is_empty(cursor, config.TRANSACTIONS_TABLE):
+            _partition_in_place(cursor, months_ahead)
+            conn.commit()
+            return True
+        if table_exists(cursor, OLD_TABLE):
+            if not is_empty(cursor, OLD_TABLE):
+                raise RuntimeError(f"{OLD_TABLE} already exists; drop it before migrating again")
+            cursor.execute(f"DROP TABLE {OLD_TABLE}")
+
+        _drop_triggers(cursor)
+        _drop_referencing_foreign_keys(cursor)
+        _create_partitioned_copy(cursor, months_ahead)
+        columns = _columns(cursor)
+        _create_triggers(cursor, columns)
+        conn.commit()
+
+        # Rows inserted from now on reach the copy through the insert
+        # trigger, so only ids up to the current maximum need copying
+        cursor.execute(f"SELECT COALESCE(MIN(transaction_id), 0), COALESCE(MAX(transaction_id), 0) "
+                       f"FROM {config.TRANSACTIONS_TABLE}")
+        low, high = cursor.fetchone()
+        column_list = ', '.join(columns)
+        for start in range(low, high + 1, chunk):
+            # A row the triggers already mirrored is newer than this read, so
+            # IGNORE keeps it
+            cursor.execute(
+                f"""
+                INSERT IGNORE INTO {PARTITIONED_TABLE} ({column_list})
+                SELECT {column_list} FROM {config.TRANSACTIONS_TABLE}
+                WHERE transaction_id >= %s AND transaction_id < %s
+                LOCK IN SHARE MODE
+                """,
+                (start, start + chunk)
+            )
+            conn.commit()
+            if progress:
+                progress(min(start + chunk - 1, high), high)
+            if pause:
+                time.sleep(pause)
+
+        cursor.execute(
+            f"RENAME TABLE {config.TRANSACTIONS_TABLE} TO {OLD_TABLE}, "
+            f"{PARTITIONED_TABLE} TO {config.TRANSACTIONS_TABLE}"
+        )
+        # The triggers moved with the old table and now point nowhere
+        _drop_triggers(cursor)
+        conn.commit()
+        return True
+    finally:
+        cursor.close()
+
+
+def extend(cursor, months_ahead=None):
+    """
+    Split pmax so that partitions exist through months_ahead months from now.
+
+    pmax is normally empty, so this only changes metadata.
+
+    Returns:
+        list: Names of the partitions added
+    """
+    months_ahead = config.PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    named = [name for name, _ in partitions(cursor) if name != 'pmax']
+    if not named:
+        raise RuntimeError(f"{config.TRANSACTIONS_TABLE} is not partitioned")
+
+    last = datetime.datetime.strptime(named[-1], 'p%Y%m')
+    target = add_months(month_start(datetime.datetime.now()), months_ahead)
+    if last >= target:
+        return []
+
+    first = add_months(last, 1)
+    cursor.execute(
+        f"ALTER TABLE {config.TRANSACTIONS_TABLE} REORGANIZE PARTITION pmax INTO ("
+        f"{partition_definitions(first, target)})"
+    )
+    added = []
+    month = first
+    while month <= target:
+        added.append(partition_name(month))
+        month = add_months(month, 1)
+    return added
+
+
+def archive(cursor, month):
+    """
+    Move one month of transactions out to its own table.
+
+    The month's partition is exchanged with an empty table of the same shape,
+    which swaps their data in place, and the now empty partition is dropped.
+    Ledger entries keep their transaction ids, so balances are unaffected.
+
+    Args:
+        month (datetime.datetime): Any moment in the month to archive; it must
+            be before the current month
+
+    Returns:
+        str: Name of the archive table
+    """
+    month = month_start(month)
+    if month >= month_start(datetime.datetime.now()):
+        raise ValueError("Only past months can be archived")
+    name = partition_name(month)
+    if name not in {partition for partition, _ in partitions(cursor)}:
+        raise ValueError(f"{config.TRANSACTIONS_TABLE} has no partition {name}")
+
+    archive_table = ARCHIVE_TABLE.format(month=month)
+    cursor.execute(f"CREATE TABLE {archive_table} LIKE {config.TRANSACTIONS_TABLE}")
+    cursor.execute(f"ALTER TABLE {archive_table} REMOVE PARTITIONING")
+    cursor.execute(f"ALTER TABLE {config.TRANSACTIONS_TABLE} EXCHANGE PARTITION {name} WITH TABLE {archive_table}")
+    cursor.execute(f"ALTER TABLE {config.TRANSACTIONS_TABLE} DROP PARTITION {name}")
+    return archive_table
+
+
+def main():
+    from database.connection import get_db_connection
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'status'
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        if command == 'migrate':
+            def report(done, total):
+                print(f"\rCopied up to id {done} / {total}", end='', flush=True)
+
+            migrated = migrate(conn, progress=report)
+            print(f"\nMigrated; the old table is kept as {OLD_TABLE}" if migrated
+                  else "Already partitioned")
+        elif command == 'extend':
+            added = extend(cursor)
+            print(f"Added {', '.join(added)}" if added else "Partitions are already in place")
+        elif command == 'archive':
+            if len(sys.argv) < 3:
+                sys.exit("Usage: python -m database.partitioning archive YYYY-MM")
+            print(f"Archived to {archive(cursor, datetime.datetime.strptime(sys.argv[2], '%Y-%m'))}")
+        elif command == 'status':
+            if not is_partitioned(cursor):
+                print(f"{config.TRANSACTIONS_TABLE} is not partitioned")
+            for name, rows in partitions(cursor):
+                print(f"{name:<8} ~{rows} rows")
+        else:
+            sys.exit(f"Unknown command '{command}'. Use migrate, extend, archive or status.")
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+from mysql.connector import FieldType
+
+
+def _datetime(value):
+    return value.isoformat(' ', 'seconds')
+
+
+def _date(value):
+    return value.isoformat()
+
+
+# Converters by MySQL column type. Decimals become their exact string
+# ('1234.50'), never a float. Columns of any other type pass through as is.
+_CONVERTERS = {
+    FieldType.DECIMAL: str,
+    FieldType.NEWDECIMAL: str,
+    FieldType.DATETIME: _datetime,
+    FieldType.TIMESTAMP: _datetime,
+    FieldType.DATE: _date,
+    FieldType.TIME: str,
+}
+
+
+class RowSerializer:
+    """
+    Turns rows of one result set into JSON-ready dicts.
+
+    The converter for each column is chosen once, from the cursor
+    description, instead of type-checking every value of every row; columns
+    that need no conversion are copied without being looked at.
+
+    Args:
+        description (list): cursor.description of the executed query
+    """
+
+    def __init__(self, description):
+        self.names = [column[0] for column in description]
+        self.plan = [
+            (column[0], _CONVERTERS[column[1]])
+            for column in description
+            if column[1] in _CONVERTERS
+        ]
+
+    def row(self, row):
+        """Serialize one row, given as a dict (dictionary cursor) or a tuple"""
+        result = dict(row) if isinstance(row, dict) else dict(zip(self.names, row))
+        for name, convert in self.plan:
+            value = result[name]
+            if value is not None:
+                result[name] = convert(value)
+        return result
+
+    def rows(self, rows):
+        """Serialize a list of rows"""
+        return [self.row(row) for row in rows]
@@ -0,0 +1,57 @@
+import decimal
+
+import jwt
+import pytest
+
+import config
+from app import app
+from transactions.settlement import parse_amount
+
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+def auth_headers(user_id=1):
+    token = jwt.encode({'user_id': user_id}, config.SECRET_KEY, algorithm="HS256")
+    return {'Authorization': f'Bearer {token}'}
+
+
+@pytest.mark.parametrize('account_type, initial_balance', [
+    ('Savings', 'abc'),
+    ('Savings', '-5'),
+    ('Savings', '10.001'),
+    ('Savings', 'NaN'),
+    ('Savings', 'Infinity'),
+    ('Savings', None),
+    ('Savings', [1]),
+    ('Credit Card', '-10.001'),
+    ('Credit Card', '-Infinity'),
+    ('Credit Card', 'NaN'),
+])
+def test_create_account_rejects_invalid_initial_balance(client, account_type, initial_balance):
+    response = client.post(
+        f'{config.TRANSACTIONS_ENDPOINT}/accounts',
+        json={'account_name': 'Card', 'account_type': account_type, 'initial_balance': initial_balance},
+        headers=auth_headers()
+    )
+    assert response.status_code == 400
+    assert 'initial_balance' in response.get_json()['error']
+
+
+def test_parse_amount_allows_zero_only_when_asked():
+    assert parse_amount(0, allow_zero=True) == decimal.Decimal('0.00')
+    assert parse_amount('12.5', allow_zero=True) == decimal.Decimal('12.50')
+    with pytest.raises(ValueError):
+        parse_amount(0)
+
+
+def test_parse_amount_allows_negative_only_when_asked():
+    assert parse_amount('-1250.5', allow_zero=True, allow_negative=True) == decimal.Decimal('-1250.50')
+    with pytest.raises(ValueError):
+        parse_amount('-5', allow_zero=True)
+    with pytest.raises(ValueError):
+        parse_amount('-0.001', allow_zero=True, allow_negative=True)
@@ -0,0 +1,127 @@
+"""
+Expiry of transactions that were never verified.
+
+A transaction stays pending until its MFA token is verified. sweep() marks
+the ones older than PENDING_TRANSACTION_TTL as expired and, after
+EXPIRED_TRANSACTION_RETENTION_DAYS, deletes them, so dead rows do not pile
+up under every history scan. Both steps walk the (status, transaction_date)
+index in batches of PENDING_SWEEP_BATCH rows, committing after each, so
+locks are only held briefly. Run it periodically:
+
+    python -m transactions.expiry [seconds]
+
+(from the backend directory). With a number of seconds, the sweeper keeps
+running and sweeps again after each pause.
+
+The sweeper does not invalidate the API process's AI caches; a swept
+transaction can stay visible there for up to AI_CONTEXT_TTL seconds (see
+config).
+"""
+import datetime
+import sys
+import time
+
+import config
+
+
+def expire_pending(conn, ttl=None, batch=None):
+    """
+    Mark pending transactions older than ttl seconds as expired.
+
+    Settlement and cancellation lock the row and re-check that it is still
+    pending, so a transaction verified at the moment it expires ends up
+    either completed or expired, never both.
+
+    Returns:
+        int: Number of transactions expired
+    """
+    ttl = config.PENDING_TRANSACTION_TTL if ttl is None else ttl
+    batch = config.PENDING_SWEEP_BATCH if batch is None else batch
+
+    cursor = conn.cursor()
+    try:
+        total = 0
+        while True:
+            cursor.execute(
+                """
+                UPDATE transactions SET status = 'expired'
+                WHERE status = 'pending' AND transaction_date < NOW() - INTERVAL %s SECOND
+                ORDER BY transaction_date
+                LIMIT %s
+                """,
+                (ttl, batch)
+            )
+            expired = cursor.rowcount
+            conn.commit()
+            total += expired
+            if expired < batch:
+                return total
+    finally:
+        cursor.close()
+
+
+def purge_expired(conn, retention_days=None, batch=None):
+    """
+    Delete expired transactions older than retention_days.
+
+    Expired transactions never moved money, so nothing in the ledger refers
+    to them. A retention of 0 keeps them forever.
+
+    Returns:
+        int: Number of transactions deleted
+    """
+    retention_days = config.EXPIRED_TRANSACTION_RETENTION_DAYS if retention_days is None else retention_days
+    batch = config.PENDING_SWEEP_BATCH if batch is None else batch
+    if retention_days <= 0:
+        return 0
+
+    cursor = conn.cursor()
+    try:
+        total = 0
+        while True:
+            cursor.execute(
+                """
+                DELETE FROM transactions
+                WHERE status = 'expired' AND transaction_date < NOW() - INTERVAL %s DAY
+                ORDER BY transaction_date
+                LIMIT %s
+                """,
+                (retention_days, batch)
+            )
+            deleted = cursor.rowcount
+            conn.commit()
+            total += deleted
+            if deleted < batch:
+                return total
+    finally:
+        cursor.close()
+
+
+def sweep(conn):
+    """
+    Expire stale pending transactions, then purge old expired ones.
+
+    Returns:
+        tuple: (expired, purged) row counts
+    """
+    return expire_pending(conn), purge_expired(conn)
+
+
+def main():
+    from database.connection import get_db_connection
+
+    interval = float(sys.argv[1]) if len(sys.argv) > 1 else 0
+    while True:
+        conn = get_db_connection()
+        try:
+            expired, purged = sweep(conn)
+        finally:
+            conn.close()
+        print(f"{datetime.datetime.now():%Y-%m-%d %H:%M:%S} expired {expired}, purged {purged} transactions")
+        if not interval:
+            break
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import csv
+import io
+
+# Columns written to statements, in order
+EXPORT_COLUMNS = [
+    'transaction_id', 'transaction_date', 'transaction_type', 'amount',
+    'source_account_name', 'destination_account_name', 'description', 'status',
+]
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def csv_chunks(batches):
+    """
+    Encode batches of history rows as CSV, yielding one chunk per batch.
+
+    Amounts are written with str(), so they keep their exact two decimals.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def drain():
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    writer.writerow(EXPORT_COLUMNS)
+    yield drain()
+    for rows in batches:
+        writer.writerows(
+            [row[column] if row[column] is not None else '' for column in EXPORT_COLUMNS]
+            for row in rows
+        )
+        yield drain()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands out what has been written since the last drain"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        chunk = b''.join(self._chunks)
+        self._chunks = []
+        return chunk
+
+
+def parquet_chunks(batches, row_group_size):
+    """
+    Encode batches of history rows as a Parquet file, one row group at a time.
+
+    Rows are buffered until row_group_size is reached, written as a row group
+    and the encoded bytes are yielded straight away, so at most one row group
+    is held in memory. The footer follows the last row group.
+
+    Raises:
+        ImportError: If pyarrow is not installed
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('transaction_id', pa.int64()),
+        ('transaction_date', pa.timestamp('s')),
+        ('transaction_type', pa.string()),
+        ('amount', pa.decimal128(15, 2)),
+        ('source_account_name', pa.string()),
+        ('destination_account_name', pa.string()),
+        ('description', pa.string()),
+        ('status', pa.string()),
+    ])
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    pending = []
+
+    def write_row_group():
+        columns = {column: [row[column] for row in pending] for column in EXPORT_COLUMNS}
+        writer.write_table(pa.Table.from_pydict(columns, schema=schema), row_group_size=len(pending))
+        pending.clear()
+
+    try:
+        for rows in batches:
+            pending.extend(rows)
+            if len(pending) >= row_group_size:
+                write_row_group()
+                yield sink.drain()
+        if pending:
+            write_row_group()
+    finally:
+        writer.close()
+    yield sink.drain()
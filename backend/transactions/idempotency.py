@@ -0,0 +1,251 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import mysql.connector
+from flask import Response, jsonify, make_response, request
+from mysql.connector import errorcode
+
+import config
+from database.connection import get_db_connection
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyStore:
+    """
+    Remembers the response to each (user, endpoint, Idempotency-Key).
+
+    The idempotency_keys table is the source of truth: the first request
+    with a key claims it with an INSERT, which the primary key makes atomic,
+    so of several concurrent duplicates exactly one runs and the others are
+    told it is in progress. Completed responses are also kept in a bounded
+    in-process LRU, so replays usually skip the database. Keys expire after
+    ttl seconds, and a claim whose request never finished (the worker died)
+    can be taken over after lock_timeout seconds.
+
+    Args:
+        ttl (int): Seconds a key and its response are kept
+        max_entries (int): Capacity of the in-process LRU
+        lock_timeout (int): Seconds before an unfinished claim is considered abandoned
+        purge_interval (int): Minimum seconds between deletes of expired rows
+    """
+
+    def __init__(self, ttl=86400, max_entries=4096, lock_timeout=60, purge_interval=300):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock_timeout = lock_timeout
+        self.purge_interval = purge_interval
+        self._entries = OrderedDict()  # (user_id, endpoint, key) -> (expires_at, request_hash, status, body)
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def _cached(self, cache_key):
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[cache_key]
+                return None
+            self._entries.move_to_end(cache_key)
+            return entry
+
+    def _remember(self, cache_key, ttl, request_hash, status, body):
+        if self.max_entries <= 0 or ttl <= 0:
+            return
+        with self._lock:
+            self._entries[cache_key] = (time.monotonic() + ttl, request_hash, status, body)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def begin(self, user_id, endpoint, key, request_hash):
+        """
+        Claim a key, or find out what happened to the request that already did.
+
+        Returns:
+            tuple: ('proceed', None) if the caller should run the request,
+                ('replay', (status, body)) with the stored response,
+                ('in_progress', None) if a duplicate is still running, or
+                ('mismatch', None) if the key was used for a different request
+        """
+        cache_key = (user_id, endpoint, key)
+        entry = self._cached(cache_key)
+        if entry is not None:
+            if entry[1] != request_hash:
+                return 'mismatch', None
+            return 'replay', (entry[2], entry[3])
+
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        try:
+            self._purge_expired(conn, cursor)
+            for _ in range(2):
+                try:
+                    cursor.execute(
+                        """
+                        INSERT INTO idempotency_keys (user_id, endpoint, idempotency_key, request_hash, expires_at)
+                        VALUES (%s, %s, %s, %s, NOW() + INTERVAL %s SECOND)
+                        """,
+                        (user_id, endpoint, key, request_hash, self.ttl)
+                    )
+                    conn.commit()
+                    return 'proceed', None
+                except mysql.connector.IntegrityError as err:
+                    conn.rollback()
+                    if err.errno != errorcode.ER_DUP_ENTRY:
+                        raise
+
+                cursor.execute(
+                    """
+                    SELECT request_hash, status_code, response_body,
+                           TIMESTAMPDIFF(SECOND, NOW(), expires_at) AS ttl_left,
+                           TIMESTAMPDIFF(SECOND, created_at, NOW()) AS age
+                    FROM idempotency_keys
+                    WHERE user_id = %s AND endpoint = %s AND idempotency_key = %s
+                    """,
+                    (user_id, endpoint, key)
+                )
+                row = cursor.fetchone()
+                if row is None:
+                    continue  # Deleted in the meantime; claim it again
+                if row['ttl_left'] <= 0:
+                    # Expired: drop it and claim the key afresh
+                    cursor.execute(
+                        "DELETE FROM idempotency_keys WHERE user_id = %s AND endpoint = %s "
+                        "AND idempotency_key = %s AND expires_at <= NOW()",
+                        (user_id, endpoint, key)
+                    )
+                    conn.commit()
+                    continue
+                if row['request_hash'] != request_hash:
+                    return 'mismatch', None
+                if row['status_code'] is not None:
+                    self._remember(cache_key, row['ttl_left'], request_hash, row['status_code'], row['response_body'])
+                    return 'replay', (row['status_code'], row['response_body'])
+                if row['age'] >= self.lock_timeout:
+                    # The request holding the claim never finished; take it over
+                    cursor.execute(
+                        "UPDATE idempotency_keys SET created_at = NOW() WHERE user_id = %s AND endpoint = %s "
+                        "AND idempotency_key = %s AND status_code IS NULL AND created_at <= NOW() - INTERVAL %s SECOND",
+                        (user_id, endpoint, key, self.lock_timeout)
+                    )
+                    conn.commit()
+                    if cursor.rowcount == 1:
+                        return 'proceed', None
+                return 'in_progress', None
+            return 'in_progress', None
+        finally:
+            cursor.close()
+            conn.close()
+
+    def complete(self, user_id, endpoint, key, request_hash, status, body):
+        """Store the response for a claimed key"""
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                """
+                UPDATE idempotency_keys SET status_code = %s, response_body = %s
+                WHERE user_id = %s AND endpoint = %s AND idempotency_key = %s
+                """,
+                (status, body, user_id, endpoint, key)
+            )
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+        self._remember((user_id, endpoint, key), self.ttl, request_hash, status, body)
+
+    def release(self, user_id, endpoint, key):
+        """Give up a claim without a response, so the request can be retried"""
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "DELETE FROM idempotency_keys WHERE user_id = %s AND endpoint = %s "
+                "AND idempotency_key = %s AND status_code IS NULL",
+                (user_id, endpoint, key)
+            )
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _purge_expired(self, conn, cursor):
+        """Delete a batch of expired rows, at most once per purge_interval"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_purge < self.purge_interval:
+                return
+            self._last_purge = now
+        cursor.execute("DELETE FROM idempotency_keys WHERE expires_at <= NOW() LIMIT 1000")
+        conn.commit()
+
+
+idempotency_store = IdempotencyStore(
+    ttl=config.IDEMPOTENCY_TTL,
+    max_entries=config.IDEMPOTENCY_CACHE_MAX_ENTRIES,
+    lock_timeout=config.IDEMPOTENCY_LOCK_TIMEOUT
+)
+
+
+def idempotent(endpoint):
+    """
+    Make a token_required route replay its response for a repeated Idempotency-Key.
+
+    Requests without the header run as before. A repeat of a completed
+    request returns the stored response with an Idempotent-Replayed header;
+    a repeat while the first is still running gets 409, and reusing a key
+    for a different body gets 422. Server errors (5xx) are not stored, so
+    those requests can be retried with the same key.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(current_user_id, *args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return f(current_user_id, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return jsonify({'error': f'{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters'}), 400
+
+            request_hash = hashlib.sha256(request.get_data()).hexdigest()
+            try:
+                outcome, stored = idempotency_store.begin(current_user_id, endpoint, key, request_hash)
+            except mysql.connector.Error as err:
+                return jsonify({'error': str(err)}), 500
+
+            if outcome == 'replay':
+                status, body = stored
+                response = Response(body, status=status, mimetype='application/json')
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+            if outcome == 'in_progress':
+                return jsonify({'error': 'A request with this Idempotency-Key is still being processed'}), 409
+            if outcome == 'mismatch':
+                return jsonify({'error': 'This Idempotency-Key was already used for a different request'}), 422
+
+            try:
+                response = make_response(f(current_user_id, *args, **kwargs))
+            except Exception:
+                idempotency_store.release(current_user_id, endpoint, key)
+                raise
+
+            try:
+                if response.status_code >= 500:
+                    idempotency_store.release(current_user_id, endpoint, key)
+                else:
+                    idempotency_store.complete(current_user_id, endpoint, key, request_hash,
+                                               response.status_code, response.get_data(as_text=True))
+            except mysql.connector.Error:
+                # The request itself succeeded; a missing record only means
+                # a retry is not recognised as a duplicate
+                pass
+            return response
+
+        return decorated
+    return decorator
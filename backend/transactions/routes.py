@@ -1,26 +1,30 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 import mysql.connector
 import config
 from auth.utils import verify_totp
+from .utils import encode_cursor, decode_cursor, parse_history_filters, keyset_condition, build_history_query
+from .export import EXPORT_FORMATS, csv_chunks, parquet_chunks
+from .settlement import (SettlementError, cancel_transaction, parse_amount, run_in_transaction,
+                         settle_transaction, settle_transactions)
+from .idempotency import idempotent
+from database.connection import get_db_connection
+from database.serialization import RowSerializer
+from database.ledger import BALANCE_SQL, account_balance, append_opening_entries
+from database.daily_totals import summarize
+from ai.response_cache import response_cache
+from ai.context import user_context
+from ai.account_index import account_index
 import jwt
 from functools import wraps
 import datetime
 import decimal
+import json
 from flask import jsonify
 import mysql.connector
 
 transactions_bp = Blueprint('transactions', __name__)
 
 
-def get_db_connection():
-    return mysql.connector.connect(
-        host=config.DB_HOST,
-        user=config.DB_USER,
-        password=config.DB_PASSWORD,
-        database=config.DB_NAME
-    )
-
-
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -42,28 +46,66 @@ def token_required(f):
     return decorated
 
 
-@transactions_bp.route('/initiate', methods=['POST'])
-@token_required
-def initiate_transaction(current_user_id):
-    data = request.get_json()
+def _parse_transaction_request(data):
+    """
+    Validate the fields of one transaction to initiate.
+
+    Returns:
+        dict: source_account_id, destination_account_id (int or None), amount
+            (Decimal), transaction_type and description
+
+    Raises:
+        ValueError: With the message to report to the client
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Missing required fields')
     source_account_id = data.get('source_account_id')
     destination_account_id = data.get('destination_account_id')
     amount = data.get('amount')
     transaction_type = data.get('transaction_type')
-    description = data.get('description')
 
     if not all([source_account_id, amount, transaction_type]):
-        return jsonify({'error': 'Missing required fields'}), 400
+        raise ValueError('Missing required fields')
 
     # Validate transaction type
     if transaction_type not in config.TRANSACTION_TYPES:
-        return jsonify(
-            {'error': f'Invalid transaction type. Must be one of: {", ".join(config.TRANSACTION_TYPES)}'}), 400
+        raise ValueError(f'Invalid transaction type. Must be one of: {", ".join(config.TRANSACTION_TYPES)}')
 
     # Validate transaction amount
-    if float(amount) > config.MAX_TRANSACTION_AMOUNT:
-        return jsonify(
-            {'error': f'Transaction amount exceeds the maximum limit of {config.MAX_TRANSACTION_AMOUNT}'}), 400
+    amount = parse_amount(amount)
+    if amount > config.MAX_TRANSACTION_AMOUNT:
+        raise ValueError(f'Transaction amount exceeds the maximum limit of {config.MAX_TRANSACTION_AMOUNT}')
+
+    try:
+        source_account_id = int(source_account_id)
+        destination_account_id = int(destination_account_id) if destination_account_id is not None else None
+    except (TypeError, ValueError):
+        raise ValueError('Account ids must be integers')
+    if destination_account_id == source_account_id:
+        raise ValueError('Source and destination accounts must be different')
+
+    return {
+        'source_account_id': source_account_id,
+        'destination_account_id': destination_account_id,
+        'amount': amount,
+        'transaction_type': transaction_type,
+        'description': data.get('description')
+    }
+
+
+@transactions_bp.route('/initiate', methods=['POST'])
+@token_required
+@idempotent('initiate')
+def initiate_transaction(current_user_id):
+    try:
+        item = _parse_transaction_request(request.get_json())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    source_account_id = item['source_account_id']
+    destination_account_id = item['destination_account_id']
+    amount = item['amount']
+    transaction_type = item['transaction_type']
+    description = item['description']
 
     # Verify the source account belongs to the current user
     conn = get_db_connection()
@@ -71,7 +113,8 @@ def initiate_transaction(current_user_id):
 
     try:
         cursor.execute(
-            "SELECT * FROM accounts WHERE account_id = %s AND user_id = %s",
+            f"SELECT a.account_id, {BALANCE_SQL} AS balance FROM accounts a "
+            f"WHERE a.account_id = %s AND a.user_id = %s",
             (source_account_id, current_user_id)
         )
         account = cursor.fetchone()
@@ -79,8 +122,9 @@ def initiate_transaction(current_user_id):
         if not account:
             return jsonify({'error': 'Invalid source account'}), 403
 
-        # Check if sufficient balance
-        if float(account['balance']) < float(amount):
+        # Early feedback only: the balance can change before verification,
+        # so settlement checks it again under the account's row lock
+        if account['balance'] < amount:
             return jsonify({'error': 'Insufficient funds'}), 400
 
         # Create pending transaction
@@ -94,9 +138,20 @@ def initiate_transaction(current_user_id):
         )
         conn.commit()
         transaction_id = cursor.lastrowid
+        response_cache.invalidate_user(current_user_id)
+        user_context.apply_transaction({
+            'transaction_id': transaction_id,
+            'source_account_id': account['account_id'],
+            'destination_account_id': destination_account_id,
+            'amount': amount,
+            'transaction_type': transaction_type,
+            'description': description,
+            'status': 'pending',
+            'transaction_date': None
+        })
 
         # Check if MFA is required based on amount threshold
-        require_mfa = float(amount) >= config.REQUIRE_MFA_THRESHOLD
+        require_mfa = amount >= config.REQUIRE_MFA_THRESHOLD
 
         return jsonify({
             'message': 'Transaction initiated, requires MFA verification' if require_mfa else 'Transaction initiated',
@@ -111,8 +166,121 @@ def initiate_transaction(current_user_id):
         conn.close()
 
 
+@transactions_bp.route('/initiate-batch', methods=['POST'])
+@token_required
+@idempotent('initiate-batch')
+def initiate_transaction_batch(current_user_id):
+    """
+    Initiate many transactions in one request.
+
+    Expects {"transactions": [...]}, each item shaped like the body of
+    /initiate. Every item is validated up front and all accounts involved
+    are looked up with one query; the valid items are then inserted in one
+    database transaction with one commit. Invalid items are reported without
+    stopping the rest. MFA is decided once for the whole batch, on its
+    total amount.
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('transactions')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'transactions must be a non-empty list'}), 400
+    if len(items) > config.MAX_BATCH_SIZE:
+        return jsonify({'error': f'A batch can hold at most {config.MAX_BATCH_SIZE} transactions'}), 400
+
+    results = []
+    valid = []
+    for index, raw in enumerate(items):
+        try:
+            item = _parse_transaction_request(raw)
+        except ValueError as e:
+            results.append({'index': index, 'status': 'rejected', 'error': str(e)})
+            continue
+        results.append(None)
+        valid.append((index, item))
+
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+
+    try:
+        accounts = {}
+        account_ids = sorted({
+            account_id for _, item in valid
+            for account_id in (item['source_account_id'], item['destination_account_id'])
+            if account_id is not None
+        })
+        if account_ids:
+            placeholders = ', '.join(['%s'] * len(account_ids))
+            cursor.execute(
+                f"SELECT a.account_id, a.user_id, {BALANCE_SQL} AS balance FROM accounts a "
+                f"WHERE a.account_id IN ({placeholders})",
+                account_ids
+            )
+            accounts = {row['account_id']: row for row in cursor.fetchall()}
+
+        # Same advisory funds check as /initiate, but against what the
+        # earlier items of the batch already take from each source account
+        committed = {}
+        accepted = []
+        for index, item in valid:
+            source = accounts.get(item['source_account_id'])
+            if not source or source['user_id'] != current_user_id:
+                results[index] = {'index': index, 'status': 'rejected', 'error': 'Invalid source account'}
+                continue
+            if item['destination_account_id'] is not None and item['destination_account_id'] not in accounts:
+                results[index] = {'index': index, 'status': 'rejected', 'error': 'Invalid destination account'}
+                continue
+            spent = committed.get(source['account_id'], 0) + item['amount']
+            if source['balance'] < spent:
+                results[index] = {'index': index, 'status': 'rejected', 'error': 'Insufficient funds'}
+                continue
+            committed[source['account_id']] = spent
+            accepted.append((index, item))
+
+        if accepted:
+            # One INSERT per item so each id comes from its own lastrowid;
+            # ids of a multi-row INSERT are only consecutive when
+            # auto_increment_increment is 1
+            transaction_ids = []
+            for _, item in accepted:
+                cursor.execute(
+                    """
+                    INSERT INTO transactions 
+                    (source_account_id, destination_account_id, amount, transaction_type, description, status) 
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    """,
+                    (item['source_account_id'], item['destination_account_id'], item['amount'],
+                     item['transaction_type'], item['description'], 'pending')
+                )
+                transaction_ids.append(cursor.lastrowid)
+            conn.commit()
+            response_cache.invalidate_user(current_user_id)
+
+            for transaction_id, (index, item) in zip(transaction_ids, accepted):
+                user_context.apply_transaction(dict(item, transaction_id=transaction_id,
+                                                    status='pending', transaction_date=None))
+                results[index] = {'index': index, 'status': 'pending', 'transaction_id': transaction_id}
+
+        total = sum((item['amount'] for _, item in accepted), decimal.Decimal('0'))
+        require_mfa = bool(accepted) and total >= config.REQUIRE_MFA_THRESHOLD
+
+        return jsonify({
+            'message': f'{len(accepted)} of {len(items)} transactions initiated',
+            'transaction_ids': [results[index]['transaction_id'] for index, _ in accepted],
+            'total_amount': str(total),
+            'require_mfa': require_mfa,
+            'results': results
+        }), 201 if accepted else 400
+
+    except mysql.connector.Error as err:
+        return jsonify({'error': str(err)}), 500
+    finally:
+        cursor.close()
+        conn.close()
+
+
 @transactions_bp.route('/verify-mfa', methods=['POST'])
 @token_required
+@idempotent('verify-mfa')
 def verify_transaction_mfa(current_user_id):
     data = request.get_json()
     transaction_id = data.get('transaction_id')
@@ -128,9 +296,10 @@ def verify_transaction_mfa(current_user_id):
         # Get transaction details
         cursor.execute(
             """
-            SELECT t.*, a.user_id, a.balance 
+            SELECT t.*, a.user_id, da.user_id AS destination_user_id
             FROM transactions t
             JOIN accounts a ON t.source_account_id = a.account_id
+            LEFT JOIN accounts da ON t.destination_account_id = da.account_id
             WHERE t.transaction_id = %s
             """,
             (transaction_id,)
@@ -153,36 +322,22 @@ def verify_transaction_mfa(current_user_id):
 
         # Verify the MFA token
         if verify_totp(user['mfa_secret'], mfa_token):
-            # Update transaction status
-            cursor.execute(
-                "UPDATE transactions SET status = %s, mfa_verified = %s WHERE transaction_id = %s",
-                ('completed', True, transaction_id)
-            )
-
-            # Update account balances
-            source_balance = float(transaction['balance']) - float(transaction['amount'])
-            cursor.execute(
-                "UPDATE accounts SET balance = %s, last_updated = NOW() WHERE account_id = %s",
-                (source_balance, transaction['source_account_id'])
-            )
-
-            # If there's a destination account, update its balance too
-            if transaction['destination_account_id']:
-                cursor.execute(
-                    """
-                    UPDATE accounts 
-                    SET balance = balance + %s, last_updated = NOW() 
-                    WHERE account_id = %s
-                    """,
-                    (transaction['amount'], transaction['destination_account_id'])
-                )
-
-            conn.commit()
+            # Status change and ledger entries commit together or not at all
+            try:
+                settled = run_in_transaction(conn, lambda c: settle_transaction(c, transaction_id))
+            except SettlementError as e:
+                return jsonify({'error': str(e)}), e.status
+
+            # Balances changed, so cached AI answers for both sides are stale
+            response_cache.invalidate_user(current_user_id)
+            if transaction['destination_user_id'] is not None:
+                response_cache.invalidate_user(transaction['destination_user_id'])
+            user_context.apply_transaction(settled, settled=True)
 
             return jsonify({
                 'message': 'Transaction completed successfully',
                 'transaction_id': transaction_id,
-                'new_balance': source_balance
+                'new_balance': str(settled['source_balance'])
             }), 200
         else:
             return jsonify({'error': 'Invalid MFA token'}), 401
@@ -195,86 +350,463 @@ def verify_transaction_mfa(current_user_id):
         conn.close()
 
 
+
+@transactions_bp.route('/verify-batch', methods=['POST'])
+@token_required
+@idempotent('verify-batch')
+def verify_transaction_batch(current_user_id):
+    """
+    Verify and settle several pending transactions with one MFA token.
+
+    Expects {"transaction_ids": [...], "mfa_token": "123456"}. The token is
+    checked once; the transactions are then loaded with one query and
+    settled in a single database transaction (see settle_transactions).
+    Returns a result per transaction: completed, or failed with the reason.
+    """
+    data = request.get_json(silent=True) or {}
+    transaction_ids = data.get('transaction_ids')
+    mfa_token = data.get('mfa_token')
+
+    if not transaction_ids or not mfa_token or not isinstance(transaction_ids, list):
+        return jsonify({'error': 'Missing transaction_ids or MFA token'}), 400
+    if len(transaction_ids) > config.MAX_BATCH_SIZE:
+        return jsonify({'error': f'A batch can hold at most {config.MAX_BATCH_SIZE} transactions'}), 400
+    try:
+        transaction_ids = sorted({int(transaction_id) for transaction_id in transaction_ids})
+    except (TypeError, ValueError):
+        return jsonify({'error': 'transaction_ids must be integers'}), 400
+
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+
+    try:
+        cursor.execute(
+            "SELECT mfa_secret FROM users WHERE user_id = %s",
+            (current_user_id,)
+        )
+        user = cursor.fetchone()
+        if not user or not verify_totp(user['mfa_secret'], mfa_token):
+            return jsonify({'error': 'Invalid MFA token'}), 401
+
+        # Ownership never changes, so it is checked before taking any locks
+        placeholders = ', '.join(['%s'] * len(transaction_ids))
+        cursor.execute(
+            f"""
+            SELECT t.transaction_id, a.user_id, da.user_id AS destination_user_id
+            FROM transactions t
+            JOIN accounts a ON t.source_account_id = a.account_id
+            LEFT JOIN accounts da ON t.destination_account_id = da.account_id
+            WHERE t.transaction_id IN ({placeholders})
+            """,
+            transaction_ids
+        )
+        owners = {row['transaction_id']: row for row in cursor.fetchall()}
+
+        results = {}
+        owned = []
+        for transaction_id in transaction_ids:
+            owner = owners.get(transaction_id)
+            if not owner:
+                results[transaction_id] = {'status': 'failed', 'error': 'Transaction not found'}
+            elif owner['user_id'] != current_user_id:
+                results[transaction_id] = {'status': 'failed', 'error': 'Unauthorized'}
+            else:
+                owned.append(transaction_id)
+
+        settled = []
+        if owned:
+            settled, failed = run_in_transaction(conn, lambda c: settle_transactions(c, owned))
+            for transaction_id, error in failed.items():
+                results[transaction_id] = {'status': 'failed', 'error': str(error)}
+
+        if settled:
+            # Balances changed, so cached AI answers for every side are stale
+            response_cache.invalidate_user(current_user_id)
+            for user_id in {owners[t['transaction_id']]['destination_user_id'] for t in settled}:
+                if user_id is not None and user_id != current_user_id:
+                    response_cache.invalidate_user(user_id)
+        for transaction in settled:
+            user_context.apply_transaction(transaction, settled=True)
+            results[transaction['transaction_id']] = {
+                'status': 'completed',
+                'new_balance': str(transaction['source_balance'])
+            }
+
+        return jsonify({
+            'message': f'{len(settled)} of {len(transaction_ids)} transactions completed',
+            'results': [dict(results[transaction_id], transaction_id=transaction_id)
+                        for transaction_id in transaction_ids]
+        }), 200
+
+    except SettlementError as e:
+        return jsonify({'error': str(e)}), e.status
+    except mysql.connector.Error as err:
+        conn.rollback()
+        return jsonify({'error': str(err)}), 500
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@transactions_bp.route('/cancel', methods=['POST'])
+@token_required
+@idempotent('cancel')
+def cancel_pending_transaction(current_user_id):
+    """
+    Cancel a pending transaction of the current user.
+
+    Only pending transactions can be cancelled; no money has moved for
+    them yet, so only the status changes.
+    """
+    data = request.get_json(silent=True) or {}
+    transaction_id = data.get('transaction_id')
+
+    if not transaction_id:
+        return jsonify({'error': 'Missing transaction_id'}), 400
+
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+
+    try:
+        cursor.execute(
+            """
+            SELECT a.user_id
+            FROM transactions t
+            JOIN accounts a ON t.source_account_id = a.account_id
+            WHERE t.transaction_id = %s
+            """,
+            (transaction_id,)
+        )
+        owner = cursor.fetchone()
+
+        if not owner:
+            return jsonify({'error': 'Transaction not found'}), 404
+        if owner['user_id'] != current_user_id:
+            return jsonify({'error': 'Unauthorized'}), 403
+
+        try:
+            cancelled = run_in_transaction(conn, lambda c: cancel_transaction(c, transaction_id))
+        except SettlementError as e:
+            return jsonify({'error': str(e)}), e.status
+
+        response_cache.invalidate_user(current_user_id)
+        user_context.apply_transaction(cancelled)
+
+        return jsonify({
+            'message': 'Transaction cancelled',
+            'transaction_id': transaction_id
+        }), 200
+
+    except mysql.connector.Error as err:
+        conn.rollback()
+        return jsonify({'error': str(err)}), 500
+    finally:
+        cursor.close()
+        conn.close()
+
 from flask import request
 
+
+class _RowBatches:
+    """
+    Rows of an executed unbuffered query, iterated in HISTORY_STREAM_BATCH sized lists.
+
+    Only one batch is held in memory at a time. The object owns the
+    connection: once the result is exhausted the connection goes back to the
+    pool. close() is registered with the response, so if the client goes
+    away first the connection, which still has unread rows pending, is
+    dropped instead.
+    """
+
+    def __init__(self, conn, cursor):
+        self._conn = conn
+        self._cursor = cursor
+
+    def __iter__(self):
+        while True:
+            rows = self._cursor.fetchmany(config.HISTORY_STREAM_BATCH)
+            if not rows:
+                break
+            yield rows
+        conn, self._conn = self._conn, None
+        self._cursor.close()
+        conn.close()
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            conn.invalidate()
+
+
+def _streaming_response(chunks, batches, mimetype, headers=None):
+    """Stream chunks, releasing the rows' connection however the response ends"""
+    response = Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+    if batches is not None:
+        response.call_on_close(batches.close)
+    return response
+
+
+def _ndjson_rows(batches, serializer):
+    """Encode row batches as NDJSON, one chunk per batch"""
+    try:
+        for rows in batches:
+            yield ''.join(json.dumps(serializer.row(row)) + '\n' for row in rows)
+    except mysql.connector.Error as err:
+        # Headers are already sent, so report the failure in-band
+        yield json.dumps({'error': str(err)}) + '\n'
+
+
+def _history_account_ids(cursor, current_user_id, account_id):
+    """
+    Return the account ids whose transactions a history query should cover.
+
+    Returns:
+        list: All of the user's account ids, or just account_id when given;
+            None if account_id does not belong to the user
+    """
+    cursor.execute(
+        "SELECT account_id FROM accounts WHERE user_id = %s",
+        (current_user_id,)
+    )
+    account_ids = [account['account_id'] for account in cursor.fetchall()]
+    if account_id is not None:
+        if account_id not in account_ids:
+            return None
+        # Only that account's index ranges need scanning
+        account_ids = [account_id]
+    return account_ids
+
+
 @transactions_bp.route('/history', methods=['GET'])
 @token_required
 def get_transaction_history(current_user_id):
+    """
+    Page through the user's transactions, newest first.
+
+    Query parameters:
+        limit: Page size (default HISTORY_DEFAULT_LIMIT, at most HISTORY_MAX_LIMIT)
+        before: Cursor; return transactions older than it (the next page)
+        after: Cursor; return transactions newer than it (the previous page)
+        transaction_type, status, date_from, date_to, min_amount, max_amount,
+        description, account_id: Optional filters, see parse_history_filters()
+
+    Returns a JSON object with the page under 'transactions' plus 'next_cursor'
+    (null on the last page) and 'prev_cursor'.
+
+    With `Accept: application/x-ndjson` or `?stream=1`, every matching row is
+    streamed instead, one JSON object per line, newest first (oldest first when
+    starting from an `after` cursor); limit does not apply.
+    """
+    wants_stream = (request.args.get('stream') in ('1', 'true')
+                    or 'application/x-ndjson' in request.headers.get('Accept', ''))
+
+    try:
+        limit = int(request.args.get('limit', config.HISTORY_DEFAULT_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    limit = max(1, min(limit, config.HISTORY_MAX_LIMIT))
+
+    before = request.args.get('before')
+    after = request.args.get('after')
+    if before and after:
+        return jsonify({'error': 'Use either before or after, not both'}), 400
+    try:
+        position = decode_cursor(before or after) if (before or after) else None
+        filters, params, account_id = parse_history_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
+    streaming = False
 
     try:
         # Get all accounts owned by the user
-        cursor.execute(
-            "SELECT account_id FROM accounts WHERE user_id = %s",
-            (current_user_id,)
-        )
-        accounts = cursor.fetchall()
+        account_ids = _history_account_ids(cursor, current_user_id, account_id)
+        if account_ids is None:
+            return jsonify({'error': 'Invalid account'}), 403
+
+        if not account_ids:
+            if wants_stream:
+                return Response('', mimetype='application/x-ndjson')
+            return jsonify({'transactions': [], 'next_cursor': None, 'prev_cursor': None}), 200
+
+        # --- Keyset pagination on (transaction_date, transaction_id) ---
+        newer = after is not None
+        if position:
+            position_date, position_id = position
+            filters.append(keyset_condition(newer))
+            params.extend([position_date, position_date, position_id])
+
+        if wants_stream:
+            query, params = build_history_query(account_ids, filters, params, newer, None)
+            # Unbuffered: rows stay on the server until the generator fetches them
+            stream_cursor = conn.cursor(dictionary=True, buffered=False)
+            stream_cursor.execute(query, params)
+            streaming = True
+            batches = _RowBatches(conn, stream_cursor)
+            return _streaming_response(
+                _ndjson_rows(batches, RowSerializer(stream_cursor.description)),
+                batches,
+                'application/x-ndjson',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
 
-        if not accounts:
-            return jsonify([]), 200
-
-        # Extract account IDs
-        account_ids = [account['account_id'] for account in accounts]
-        account_ids_str = ', '.join(['%s'] * len(account_ids))
-
-        # --- Filtering logic ---
-        filters = []
-        params = account_ids + account_ids  # for IN clauses
-
-        # Get query parameters
-        txn_type = request.args.get('transaction_type')
-        status = request.args.get('status')
-        # Optionally: date_from = request.args.get('date_from')
-        # Optionally: date_to = request.args.get('date_to')
-
-        if txn_type and txn_type.lower() != "all":
-            filters.append("t.transaction_type = %s")
-            params.append(txn_type)
-        if status and status.lower() != "all":
-            filters.append("t.status = %s")
-            params.append(status)
-        # if date_from:
-        #     filters.append("t.transaction_date >= %s")
-        #     params.append(date_from)
-        # if date_to:
-        #     filters.append("t.transaction_date <= %s")
-        #     params.append(date_to)
-
-        filter_clause = ""
-        if filters:
-            filter_clause = " AND " + " AND ".join(filters)
-
-        query = f"""
-        SELECT t.*, 
-               sa.account_name as source_account_name,
-               da.account_name as destination_account_name
-        FROM transactions t
-        LEFT JOIN accounts sa ON t.source_account_id = sa.account_id
-        LEFT JOIN accounts da ON t.destination_account_id = da.account_id
-        WHERE (t.source_account_id IN ({account_ids_str}) 
-               OR t.destination_account_id IN ({account_ids_str}))
-              {filter_clause}
-        ORDER BY t.transaction_date DESC
-        """
+        # Walk towards newer rows in ascending order, then flip the page back.
+        # One extra row tells us whether another page exists.
+        query, params = build_history_query(account_ids, filters, params, newer, limit + 1)
 
         cursor.execute(query, params)
         transactions = cursor.fetchall()
 
-        # --- Serialization ---
-        serializable_transactions = []
-        for transaction in transactions:
-            serializable_transaction = {}
-            for key, value in transaction.items():
-                if isinstance(value, datetime.datetime):
-                    serializable_transaction[key] = value.strftime('%Y-%m-%d %H:%M:%S')
-                elif isinstance(value, decimal.Decimal):
-                    serializable_transaction[key] = float(value)
-                else:
-                    serializable_transaction[key] = value
-            serializable_transactions.append(serializable_transaction)
-
-        return jsonify(serializable_transactions), 200
+        has_more = len(transactions) > limit
+        transactions = transactions[:limit]
+        if newer:
+            transactions.reverse()
+
+        if newer:
+            # Walked forwards from a cursor, so older rows lie behind this page
+            more_older, more_newer = True, has_more
+        else:
+            more_older, more_newer = has_more, position is not None
+        next_cursor = encode_cursor(transactions[-1]) if transactions and more_older else None
+        prev_cursor = encode_cursor(transactions[0]) if transactions and more_newer else None
+
+        return jsonify({
+            'transactions': RowSerializer(cursor.description).rows(transactions),
+            'next_cursor': next_cursor,
+            'prev_cursor': prev_cursor
+        }), 200
+
+    except mysql.connector.Error as err:
+        return jsonify({'error': str(err)}), 500
+    finally:
+        cursor.close()
+        # A streaming response hands the connection to its generator
+        if not streaming:
+            conn.close()
+
+@transactions_bp.route('/export', methods=['GET'])
+@token_required
+def export_transactions(current_user_id):
+    """
+    Download the user's transactions as a statement file, newest first.
+
+    Query parameters:
+        format: 'csv' (default) or 'parquet'
+        The same filters as /history (see parse_history_filters())
+
+    The file is streamed straight from an unbuffered cursor: CSV batch by
+    batch, Parquet one row group at a time.
+    """
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'Unsupported format. Must be one of: {", ".join(EXPORT_FORMATS)}'}), 400
+    if export_format == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return jsonify({'error': 'Parquet export is not available on this server'}), 501
+
+    try:
+        filters, params, account_id = parse_history_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    streaming = False
+
+    try:
+        account_ids = _history_account_ids(cursor, current_user_id, account_id)
+        if account_ids is None:
+            return jsonify({'error': 'Invalid account'}), 403
+
+        if account_ids:
+            query, params = build_history_query(account_ids, filters, params, False, None)
+            stream_cursor = conn.cursor(dictionary=True, buffered=False)
+            stream_cursor.execute(query, params)
+            streaming = True
+            batches = _RowBatches(conn, stream_cursor)
+        else:
+            batches = None
+
+        if export_format == 'parquet':
+            chunks = parquet_chunks(batches or [], config.EXPORT_PARQUET_ROW_GROUP)
+        else:
+            chunks = csv_chunks(batches or [])
+
+        mimetype, extension = EXPORT_FORMATS[export_format]
+        filename = f"transactions_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+        return _streaming_response(
+            chunks,
+            batches,
+            mimetype,
+            headers={
+                'Content-Disposition': f'attachment; filename="{filename}"',
+                'X-Accel-Buffering': 'no'
+            }
+        )
+
+    except mysql.connector.Error as err:
+        return jsonify({'error': str(err)}), 500
+    finally:
+        cursor.close()
+        # A streaming response hands the connection to its generator
+        if not streaming:
+            conn.close()
+
+
+@transactions_bp.route('/summary', methods=['GET'])
+@token_required
+def get_transaction_summary(current_user_id):
+    """
+    Inflow, outflow and per-type totals of the user's completed transactions.
+
+    Query parameters:
+        date_from, date_to: Inclusive range (YYYY-MM-DD); defaults to the
+            current month up to today
+        account_id: Restrict to one of the user's accounts
+        period: 'day' (default) or 'month', the granularity of 'series'
+
+    Read from the daily totals table plus the ledger entries not yet rolled
+    up (see database.daily_totals), so the cost grows with the number of
+    days in the range rather than the number of transactions.
+    """
+    period = request.args.get('period', 'day')
+    if period not in ('day', 'month'):
+        return jsonify({'error': "period must be 'day' or 'month'"}), 400
+
+    today = datetime.date.today()
+    try:
+        date_from = request.args.get('date_from')
+        date_to = request.args.get('date_to')
+        date_from = datetime.datetime.strptime(date_from, '%Y-%m-%d').date() if date_from else today.replace(day=1)
+        date_to = datetime.datetime.strptime(date_to, '%Y-%m-%d').date() if date_to else today
+        account_id = int(request.args['account_id']) if request.args.get('account_id') else None
+    except ValueError:
+        return jsonify({'error': 'date_from and date_to must be dates in YYYY-MM-DD format '
+                                 'and account_id an integer'}), 400
+    if date_from > date_to:
+        return jsonify({'error': 'date_from must not be after date_to'}), 400
+    if (date_to - date_from).days >= config.SUMMARY_MAX_DAYS:
+        return jsonify({'error': f'The range can span at most {config.SUMMARY_MAX_DAYS} days'}), 400
+
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+
+    try:
+        account_ids = _history_account_ids(cursor, current_user_id, account_id)
+        if account_ids is None:
+            return jsonify({'error': 'Invalid account'}), 403
+
+        summary = summarize(cursor, account_ids, date_from, date_to, period)
+        return jsonify(dict(
+            summary,
+            date_from=date_from.isoformat(),
+            date_to=date_to.isoformat(),
+            period=period
+        )), 200
 
     except mysql.connector.Error as err:
         return jsonify({'error': str(err)}), 500
@@ -282,6 +814,7 @@ def get_transaction_history(current_user_id):
         cursor.close()
         conn.close()
 
+
 @transactions_bp.route('/accounts', methods=['GET'])
 @token_required
 def get_user_accounts(current_user_id):
@@ -289,29 +822,59 @@ def get_user_accounts(current_user_id):
     cursor = conn.cursor(dictionary=True)
 
     try:
+        # balance is derived from the ledger; accounts.balance is only the opening balance
         cursor.execute(
-            "SELECT * FROM accounts WHERE user_id = %s",
+            f"""
+            SELECT a.account_id, a.user_id, a.account_name, a.account_type, {BALANCE_SQL} AS balance,
+                   a.currency, a.created_at, a.last_updated
+            FROM accounts a
+            WHERE a.user_id = %s
+            """,
             (current_user_id,)
         )
         accounts = cursor.fetchall()
-        print("============")
-        print(accounts)
-        serializable_transactions = []
-        for transaction in accounts:
-            # Create a serializable version of each transaction
-            serializable_transaction = {}
-            for key, value in transaction.items():
-                # Convert datetime objects to strings
-                if isinstance(value, datetime.datetime):
-                    serializable_transaction[key] = value.strftime('%Y-%m-%d %H:%M:%S')
-                # Convert Decimal objects to floats
-                elif isinstance(value, decimal.Decimal):
-                    serializable_transaction[key] = float(value)
-                # Handle any other special types if needed
-                else:
-                    serializable_transaction[key] = value
-            serializable_transactions.append(serializable_transaction)
-        return jsonify(serializable_transactions), 200
+        return jsonify(RowSerializer(cursor.description).rows(accounts)), 200
+
+    except mysql.connector.Error as err:
+        return jsonify({'error': str(err)}), 500
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@transactions_bp.route('/accounts/<int:account_id>/balance', methods=['GET'])
+@token_required
+def get_account_balance(current_user_id, account_id):
+    """
+    Balance of an account derived from the ledger.
+
+    With ?as_of=YYYY-MM-DD the balance at the end of that day is returned,
+    read from the last snapshot before it plus the ledger tail.
+    """
+    as_of = request.args.get('as_of')
+    before = None
+    if as_of:
+        try:
+            before = datetime.datetime.strptime(as_of, '%Y-%m-%d') + datetime.timedelta(days=1)
+        except ValueError:
+            return jsonify({'error': 'as_of must be a date in YYYY-MM-DD format'}), 400
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(
+            "SELECT 1 FROM accounts WHERE account_id = %s AND user_id = %s",
+            (account_id, current_user_id)
+        )
+        if not cursor.fetchone():
+            return jsonify({'error': 'Invalid account'}), 403
+
+        return jsonify({
+            'account_id': account_id,
+            'as_of': as_of,
+            'balance': str(account_balance(cursor, account_id, before))
+        }), 200
 
     except mysql.connector.Error as err:
         return jsonify({'error': str(err)}), 500
@@ -327,7 +890,6 @@ def create_account(current_user_id):
     account_name = data.get('account_name')
     account_type = data.get('account_type')
     currency = data.get('currency', config.DEFAULT_CURRENCY)
-    initial_balance = data.get('initial_balance', 0.00)
 
     if not all([account_name, account_type]):
         return jsonify({'error': 'Missing account name or type'}), 400
@@ -336,6 +898,13 @@ def create_account(current_user_id):
     if account_type not in config.ACCOUNT_TYPES:
         return jsonify({'error': f'Invalid account type. Must be one of: {", ".join(config.ACCOUNT_TYPES)}'}), 400
 
+    # A credit card can be opened with the debt it already carries
+    try:
+        initial_balance = parse_amount(data.get('initial_balance', 0), allow_zero=True,
+                                       allow_negative=account_type == 'Credit Card')
+    except ValueError as e:
+        return jsonify({'error': f'Invalid initial_balance: {e}'}), 400
+
     conn = get_db_connection()
     cursor = conn.cursor()
 
@@ -348,8 +917,12 @@ def create_account(current_user_id):
             """,
             (current_user_id, account_name, account_type, initial_balance, currency)
         )
-        conn.commit()
         account_id = cursor.lastrowid
+        append_opening_entries(cursor, account_id, initial_balance)
+        conn.commit()
+        response_cache.invalidate_user(current_user_id)
+        user_context.invalidate_user(current_user_id)
+        account_index.invalidate_user(current_user_id)
 
         return jsonify({
             'message': 'Account created successfully',
@@ -0,0 +1,256 @@
+import decimal
+import random
+import time
+
+import mysql.connector
+from mysql.connector import errorcode
+
+import config
+from database.ledger import account_balances, append_entries
+
+CENTS = decimal.Decimal('0.01')
+
+# Errors after which the whole transaction can simply be run again
+RETRYABLE_ERRORS = (errorcode.ER_LOCK_DEADLOCK, errorcode.ER_LOCK_WAIT_TIMEOUT)
+
+
+class SettlementError(Exception):
+    """A pending transaction cannot be settled; status is the HTTP status to report"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_amount(value, allow_zero=False, allow_negative=False):
+    """
+    Parse a client-supplied amount into an exact two-decimal Decimal.
+
+    Args:
+        value: The amount as sent by the client
+        allow_zero (bool): Accept 0, as for an opening balance
+        allow_negative (bool): Accept amounts below 0, as for the opening
+            balance of a credit card that already carries debt
+
+    Raises:
+        ValueError: If the amount is not a finite number with at most two
+            decimals, or is zero or negative when that is not allowed
+    """
+    try:
+        amount = decimal.Decimal(str(value))
+    except decimal.InvalidOperation:
+        raise ValueError("Amount must be a number")
+    if not amount.is_finite():
+        raise ValueError("Amount must be a finite number")
+    if (amount < 0 and not allow_negative) or (amount == 0 and not allow_zero):
+        raise ValueError("Amount must not be negative" if allow_zero else "Amount must be a positive number")
+    if amount != amount.quantize(CENTS):
+        raise ValueError("Amount cannot have more than two decimal places")
+    return amount.quantize(CENTS)
+
+
+def run_in_transaction(conn, work, max_retries=None, backoff=None):
+    """
+    Run work(cursor) as one database transaction and commit it.
+
+    Any transaction the caller's earlier reads left open is ended first, so
+    the consistent reads inside work see everything committed before the
+    locks it takes. Deadlocks and lock wait timeouts roll the transaction
+    back and run work again, up to max_retries more times, with jittered
+    exponential backoff. Any other error, or SettlementError, rolls back and
+    propagates.
+
+    Returns:
+        The value returned by work
+    """
+    max_retries = config.SETTLEMENT_MAX_RETRIES if max_retries is None else max_retries
+    backoff = config.SETTLEMENT_RETRY_BACKOFF if backoff is None else backoff
+
+    for attempt in range(max_retries + 1):
+        conn.rollback()
+        cursor = conn.cursor(dictionary=True)
+        try:
+            # autocommit is off, so the first statement opens the transaction
+            result = work(cursor)
+            conn.commit()
+            return result
+        except mysql.connector.Error as err:
+            conn.rollback()
+            if err.errno not in RETRYABLE_ERRORS or attempt == max_retries:
+                raise
+            time.sleep(backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+        except SettlementError:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+
+def settle_transaction(cursor, transaction_id):
+    """
+    Move the money for a pending transaction and mark it completed.
+
+    Must run inside a transaction (see run_in_transaction). The money moves
+    by appending ledger entries; no balance row is updated. Only the source
+    account row is locked, after the transaction row, so debits of one
+    account queue up to check funds one at a time while credits into it
+    never wait. The funds check reads the ledger after the lock is taken,
+    so it sees every earlier debit; credits still being committed are not
+    counted yet, which can only make it stricter. A transaction verified
+    twice at once is only settled once.
+
+    Returns:
+        dict: The settled transaction row, with 'source_balance' set to the new
+            source account balance (None for deposits)
+
+    Raises:
+        SettlementError: If the transaction is not pending or funds are insufficient
+    """
+    cursor.execute(
+        "SELECT * FROM transactions WHERE transaction_id = %s FOR UPDATE",
+        (transaction_id,)
+    )
+    transaction = cursor.fetchone()
+    if not transaction:
+        raise SettlementError('Transaction not found', 404)
+    if transaction['status'] != 'pending':
+        raise SettlementError(f"Transaction is already {transaction['status']}", 409)
+
+    source_id = transaction['source_account_id']
+    amount = transaction['amount']
+    source_balance = None
+    if source_id is not None:
+        _lock_accounts(cursor, [source_id])
+        balance = account_balances(cursor, [source_id]).get(source_id, 0)
+        if balance < amount:
+            raise SettlementError('Insufficient funds')
+        source_balance = balance - amount
+
+    append_entries(cursor, [transaction])
+    cursor.execute(
+        "UPDATE transactions SET status = %s, mfa_verified = %s WHERE transaction_id = %s",
+        ('completed', True, transaction_id)
+    )
+    return dict(transaction, status='completed', mfa_verified=True, source_balance=source_balance)
+
+
+def settle_transactions(cursor, transaction_ids):
+    """
+    Settle several pending transactions in one database transaction.
+
+    Must run inside a transaction (see run_in_transaction). Follows the lock
+    order of settle_transaction - transaction rows by ascending id, then
+    every source account by ascending account_id - so batches and single
+    settlements never deadlock each other. Transactions are applied in id
+    order against the source balances read from the ledger; one that would
+    overdraw its source is skipped and does not stop the rest. The entries
+    of all settled transactions are then appended with one statement.
+
+    Returns:
+        tuple: (settled, failed) where settled is a list of settled rows as
+            returned by settle_transaction and failed maps transaction_id to
+            the SettlementError that kept it from settling
+    """
+    transaction_ids = sorted(set(transaction_ids))
+    placeholders = ', '.join(['%s'] * len(transaction_ids))
+    cursor.execute(
+        f"SELECT * FROM transactions WHERE transaction_id IN ({placeholders}) "
+        f"ORDER BY transaction_id FOR UPDATE",
+        transaction_ids
+    )
+    transactions = {row['transaction_id']: row for row in cursor.fetchall()}
+
+    failed = {}
+    pending = []
+    for transaction_id in transaction_ids:
+        transaction = transactions.get(transaction_id)
+        if not transaction:
+            failed[transaction_id] = SettlementError('Transaction not found', 404)
+        elif transaction['status'] != 'pending':
+            failed[transaction_id] = SettlementError(f"Transaction is already {transaction['status']}", 409)
+        else:
+            pending.append(transaction)
+    if not pending:
+        return [], failed
+
+    source_ids = sorted({
+        transaction['source_account_id'] for transaction in pending
+        if transaction['source_account_id'] is not None
+    })
+    _lock_accounts(cursor, source_ids)
+    balances = account_balances(cursor, source_ids)
+
+    settled = []
+    for transaction in pending:
+        source_id = transaction['source_account_id']
+        destination_id = transaction['destination_account_id']
+        amount = transaction['amount']
+        if source_id is not None:
+            if balances.get(source_id, 0) < amount:
+                failed[transaction['transaction_id']] = SettlementError('Insufficient funds')
+                continue
+            balances[source_id] -= amount
+        # A credit to an account debited later in the batch can pay for it
+        if destination_id in balances:
+            balances[destination_id] += amount
+        settled.append(dict(transaction, status='completed', mfa_verified=True))
+    if not settled:
+        return [], failed
+
+    append_entries(cursor, settled)
+    settled_ids = [transaction['transaction_id'] for transaction in settled]
+    placeholders = ', '.join(['%s'] * len(settled_ids))
+    cursor.execute(
+        f"UPDATE transactions SET status = %s, mfa_verified = %s WHERE transaction_id IN ({placeholders})",
+        ['completed', True] + settled_ids
+    )
+
+    # source_balance reports the balance after the whole batch, which is
+    # what the account actually holds once this commits
+    for transaction in settled:
+        source_id = transaction['source_account_id']
+        transaction['source_balance'] = balances[source_id] if source_id is not None else None
+    return settled, failed
+
+
+def _lock_accounts(cursor, account_ids):
+    """Lock the account rows to be debited, in ascending order"""
+    if account_ids:
+        placeholders = ', '.join(['%s'] * len(account_ids))
+        cursor.execute(
+            f"SELECT account_id FROM accounts WHERE account_id IN ({placeholders}) "
+            f"ORDER BY account_id FOR UPDATE",
+            list(account_ids)
+        )
+        cursor.fetchall()
+
+
+def cancel_transaction(cursor, transaction_id):
+    """
+    Mark a pending transaction cancelled.
+
+    Must run inside a transaction. The row is locked first, so a cancel
+    racing a settlement of the same transaction waits for it and then sees
+    that it is no longer pending.
+
+    Returns:
+        dict: The cancelled transaction row
+
+    Raises:
+        SettlementError: If the transaction does not exist or is not pending
+    """
+    cursor.execute(
+        "SELECT * FROM transactions WHERE transaction_id = %s FOR UPDATE",
+        (transaction_id,)
+    )
+    transaction = cursor.fetchone()
+    if not transaction:
+        raise SettlementError('Transaction not found', 404)
+    if transaction['status'] != 'pending':
+        raise SettlementError(f"Transaction is already {transaction['status']}", 409)
+
+    cursor.execute(
+        "UPDATE transactions SET status = %s WHERE transaction_id = %s",
+        ('cancelled', transaction_id)
+    )
+    return dict(transaction, status='cancelled')
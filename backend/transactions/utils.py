@@ -0,0 +1,197 @@
+import base64
+import datetime
+import decimal
+
+CURSOR_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def encode_cursor(transaction):
+    """
+    Build an opaque pagination cursor from a transaction row.
+
+    The cursor encodes the row's position in (transaction_date, transaction_id) order.
+    """
+    date = transaction['transaction_date']
+    if isinstance(date, datetime.datetime):
+        date = date.strftime(CURSOR_DATE_FORMAT)
+    raw = f"{date}|{transaction['transaction_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor().
+
+    Returns:
+        tuple: (transaction_date as datetime, transaction_id as int)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date, transaction_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.datetime.strptime(date, CURSOR_DATE_FORMAT), int(transaction_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def parse_history_filters(args):
+    """
+    Turn history query parameters into SQL conditions on alias `t`.
+
+    Supported parameters: transaction_type, status, date_from and date_to
+    (YYYY-MM-DD, both inclusive), min_amount, max_amount, description
+    (case-insensitive prefix) and account_id. Date bounds are plain ranges on
+    transaction_date, so they narrow the (account, transaction_date) index
+    scans directly.
+
+    Args:
+        args (MultiDict): Request query parameters
+
+    Returns:
+        tuple: (filters, params, account_id); account_id is None when not given
+
+    Raises:
+        ValueError: If a parameter is malformed
+    """
+    filters = []
+    params = []
+
+    txn_type = args.get('transaction_type')
+    status = args.get('status')
+    if txn_type and txn_type.lower() != "all":
+        filters.append("t.transaction_type = %s")
+        params.append(txn_type)
+    if status and status.lower() != "all":
+        filters.append("t.status = %s")
+        params.append(status)
+
+    try:
+        date_from = args.get('date_from')
+        date_to = args.get('date_to')
+        date_from = datetime.datetime.strptime(date_from, '%Y-%m-%d') if date_from else None
+        date_to = datetime.datetime.strptime(date_to, '%Y-%m-%d') if date_to else None
+    except ValueError:
+        raise ValueError("date_from and date_to must be dates in YYYY-MM-DD format")
+    if date_from and date_to and date_from > date_to:
+        raise ValueError("date_from must not be after date_to")
+    if date_from:
+        filters.append("t.transaction_date >= %s")
+        params.append(date_from)
+    if date_to:
+        # Inclusive: everything before the start of the next day
+        filters.append("t.transaction_date < %s")
+        params.append(date_to + datetime.timedelta(days=1))
+
+    try:
+        min_amount = args.get('min_amount')
+        max_amount = args.get('max_amount')
+        min_amount = decimal.Decimal(min_amount) if min_amount else None
+        max_amount = decimal.Decimal(max_amount) if max_amount else None
+    except decimal.InvalidOperation:
+        raise ValueError("min_amount and max_amount must be numbers")
+    if any(amount is not None and not amount.is_finite() for amount in (min_amount, max_amount)):
+        raise ValueError("min_amount and max_amount must be numbers")
+    if min_amount is not None and max_amount is not None and min_amount > max_amount:
+        raise ValueError("min_amount must not be greater than max_amount")
+    if min_amount is not None:
+        filters.append("t.amount >= %s")
+        params.append(min_amount)
+    if max_amount is not None:
+        filters.append("t.amount <= %s")
+        params.append(max_amount)
+
+    description = args.get('description')
+    if description:
+        filters.append("t.description LIKE %s")
+        params.append(_escape_like(description) + '%')
+
+    account_id = args.get('account_id')
+    if account_id:
+        try:
+            account_id = int(account_id)
+        except ValueError:
+            raise ValueError("account_id must be an integer")
+    else:
+        account_id = None
+
+    return filters, params, account_id
+
+
+def keyset_condition(newer):
+    """
+    SQL condition selecting the rows after a cursor position in page order.
+
+    Takes the parameters (position_date, position_date, position_id). The
+    leading date bound is what the index range scan uses; the second
+    condition breaks ties on transaction_id.
+    """
+    comparison = '>' if newer else '<'
+    return (f"t.transaction_date {comparison}= %s "
+            f"AND (t.transaction_date {comparison} %s OR t.transaction_id {comparison} %s)")
+
+
+def build_history_query(account_ids, filters, filter_params, newer, limit):
+    """
+    Build the transaction history query for a set of accounts.
+
+    Rather than one `source IN (...) OR destination IN (...)` scan followed
+    by a sort, every account contributes two branches - its outgoing and its
+    incoming transactions - each of which is a range scan of the
+    (account, transaction_date, transaction_id) indexes, already in page
+    order and stopped after `limit` rows. The branches are combined with
+    UNION ALL, so only the few rows they return are merged and sorted.
+    Transfers between the user's own accounts are only taken from the
+    outgoing side, so no row appears twice.
+
+    Args:
+        account_ids (list): The user's account ids
+        filters (list): Extra SQL conditions on alias `t`, applied inside every branch
+        filter_params (list): Parameters for `filters`
+        newer (bool): Walk towards newer transactions (ascending order) instead of older ones
+        limit (int): Maximum rows to return, or None for every matching row
+
+    Returns:
+        tuple: (query, params)
+    """
+    direction = 'ASC' if newer else 'DESC'
+    order_by = f"ORDER BY t.transaction_date {direction}, t.transaction_id {direction}"
+    # Without a limit the branch order would be discarded by the merge anyway
+    branch_tail = f" {order_by} LIMIT %s" if limit is not None else ""
+    limit_params = [limit] if limit is not None else []
+    extra = ''.join(f" AND {condition}" for condition in filters)
+    own_accounts = ', '.join(['%s'] * len(account_ids))
+
+    branches = []
+    params = []
+    for account_id in account_ids:
+        branches.append(
+            f"(SELECT t.* FROM transactions t WHERE t.source_account_id = %s{extra}{branch_tail})"
+        )
+        params.extend([account_id, *filter_params, *limit_params])
+        branches.append(
+            f"(SELECT t.* FROM transactions t WHERE t.destination_account_id = %s "
+            f"AND (t.source_account_id IS NULL OR t.source_account_id NOT IN ({own_accounts})){extra}"
+            f"{branch_tail})"
+        )
+        params.extend([account_id, *account_ids, *filter_params, *limit_params])
+
+    union = "\n            UNION ALL\n            ".join(branches)
+    query = f"""
+        SELECT t.*,
+               sa.account_name as source_account_name,
+               da.account_name as destination_account_name
+        FROM (
+            {union}
+        ) t
+        LEFT JOIN accounts sa ON t.source_account_id = sa.account_id
+        LEFT JOIN accounts da ON t.destination_account_id = da.account_id
+        {order_by}{" LIMIT %s" if limit is not None else ""}
+        """
+    params.extend(limit_params)
+    return query, params
@@ -55,23 +55,46 @@ def validate_token(api_url):
     return True
 
 
+def stream_ai_tokens(question, api_url):
+    """Yield answer tokens from the streaming chat endpoint as they arrive"""
+    headers = {
+        "Authorization": f"Bearer {st.session_state.token}",
+        "Accept": "text/event-stream"
+    }
+    with requests.post(
+        f"{api_url}/ai/chat",
+        headers=headers,
+        json={"message": question, "stream": True},
+        stream=True,
+        timeout=30
+    ) as response:
+        if response.status_code != 200:
+            logger.error(f"AI request failed with status {response.status_code}: {response.text}")
+            yield f"Error: Unable to get a response (Status: {response.status_code})"
+            return
+
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            event = json.loads(line[len("data:"):])
+            if event.get('done'):
+                return
+            yield event.get('token', '')
+
+
 def ask_ai(question, api_url):
-    """Send a question to the regular AI assistant"""
+    """Send a question to the regular AI assistant, rendering the answer as it streams in"""
     try:
-        headers = {"Authorization": f"Bearer {st.session_state.token}"}
-        with st.spinner("AI is thinking..."):
-            response = requests.post(
-                f"{api_url}/ai/chat",
-                headers=headers,
-                json={"message": question},
-                timeout=30
-            )
-
-        if response.status_code == 200:
-            return response.json().get('response', "No response received")
-        else:
-            logger.error(f"AI request failed with status {response.status_code}: {response.text}")
-            return f"Error: Unable to get a response (Status: {response.status_code})"
+        placeholder = st.empty()
+        answer = ""
+        for token in stream_ai_tokens(question, api_url):
+            answer += token
+            placeholder.markdown(
+                f"""<div style='background-color: #f0f0f0; padding: 10px; 
+                border-radius: 10px; margin-bottom: 10px; border-left: 4px solid #32CD32;'>
+                <strong>AI:</strong> {answer}</div>""",
+                unsafe_allow_html=True)
+        return answer or "No response received"
     except requests.exceptions.Timeout:
         return "Error: The request timed out. Please try again."
     except requests.exceptions.ConnectionError:
@@ -104,6 +127,9 @@ def call_financial_tool_api(query, api_url):
             return f"Error: The financial tool returned an error (Status: {response.status_code})"
 
         transaction_data = response.json().get('answer', {})
+        if not isinstance(transaction_data, dict):
+            # The tool could not resolve the request, e.g. an ambiguous account name
+            return str(transaction_data)
         st.session_state.transaction_details = transaction_data
 
         # Initiate the transaction
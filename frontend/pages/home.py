@@ -44,8 +44,9 @@ def fetch_transactions(api_url: str, token_valid: bool) -> List[Dict[str, Any]]:
     """Fetch transactions from API or return demo data."""
     if token_valid:
         transactions_url = get_endpoint_url(api_url, "transactions", "history")
-        transactions = api_get(transactions_url, {"limit": 5})
-        if isinstance(transactions, list) and transactions:
+        response = api_get(transactions_url, {"limit": 5})
+        transactions = response.get('transactions') if isinstance(response, dict) else None
+        if transactions:
             logger.info("Fetched transactions from API")
             return transactions
         logger.warning("No transactions from API, using demo data")
@@ -166,6 +167,8 @@ def render(api_url: str):
         st.subheader("Account Summary")
         if accounts:
             df_accounts = pd.DataFrame(accounts)
+            # The API sends balances as exact decimal strings
+            df_accounts['balance'] = pd.to_numeric(df_accounts['balance'])
             account_summary(df_accounts)
         else:
             st.info("No accounts found. Create an account to get started.")
@@ -1,14 +1,19 @@
 import streamlit as st
 import pandas as pd
 import logging
+import json
+import uuid
 from datetime import datetime
-from utils.api import api_get, api_post, get_endpoint_url, test_auth_token
+from utils.api import api_get, api_post, api_download, get_endpoint_url, test_auth_token
 import requests
 
 # Configure logger
 logger = logging.getLogger("transactions")
 logging.basicConfig(level=logging.INFO)
 
+# Transactions fetched per history page
+HISTORY_PAGE_SIZE = 50
+
 
 def render(api_url):
     logger.info("Rendering transactions page")
@@ -44,6 +49,28 @@ def render(api_url):
         render_transaction_history(api_url, token_valid)
 
 
+def get_idempotency_key(name, payload):
+    """
+    Return the Idempotency-Key for a request.
+
+    Resubmitting the same payload (e.g. after a timeout) reuses the key, so
+    the server answers with the original result instead of running it again.
+    A different payload gets a new key.
+    """
+    fingerprint = json.dumps(payload, sort_keys=True, default=str)
+    state_key = f"{name}_idempotency"
+    saved = st.session_state.get(state_key)
+    if not saved or saved['fingerprint'] != fingerprint:
+        saved = {'fingerprint': fingerprint, 'key': str(uuid.uuid4())}
+        st.session_state[state_key] = saved
+    return saved['key']
+
+
+def clear_idempotency_key(name):
+    """Forget the key once the server has given a definite answer"""
+    st.session_state.pop(f"{name}_idempotency", None)
+
+
 def render_new_transaction_form(api_url, token_valid):
     st.subheader("Make a New Transaction")
 
@@ -124,9 +151,11 @@ def render_new_transaction_form(api_url, token_valid):
                         json=transaction_data,
                         headers={
                             "Authorization": f"Bearer {token}",
-                            "Content-Type": "application/json"
+                            "Content-Type": "application/json",
+                            "Idempotency-Key": get_idempotency_key("initiate", transaction_data)
                         }
                     )
+                    clear_idempotency_key("initiate")
 
                     if response.status_code in [200, 201]:
                         # Success
@@ -201,7 +230,10 @@ def render_mfa_verification(api_url, token_valid, transaction_id=''):
 
                 # Make API call
                 verify_url = get_endpoint_url(api_url, "transactions", "verify-mfa")
-                verify_response = api_post(verify_url, verify_data)
+                verify_response = api_post(verify_url, verify_data,
+                                           idempotency_key=get_idempotency_key("verify", verify_data))
+                if not str(verify_response.get('error', '')).startswith(("Request timed out", "Connection error")):
+                    clear_idempotency_key("verify")
 
                 if 'error' not in verify_response:
                     # Success
@@ -264,6 +296,37 @@ def render_mfa_verification(api_url, token_valid, transaction_id=''):
         st.rerun()
 
 
+def fetch_history_page(api_url, filter_params, before=None):
+    """Fetch one page of history and append it to the transactions in session state"""
+    params = dict(filter_params, limit=HISTORY_PAGE_SIZE)
+    if before:
+        params['before'] = before
+
+    transactions_url = get_endpoint_url(api_url, "transactions", "history")
+    response = api_get(transactions_url, params)
+
+    if isinstance(response, dict) and 'error' in response:
+        st.error(f"Error fetching transactions: {response['error']}")
+        st.info("Showing demo transaction data.")
+        return False
+
+    st.session_state.history_transactions.extend(response.get('transactions', []))
+    st.session_state.history_next_cursor = response.get('next_cursor')
+    return True
+
+
+def fetch_filter_accounts(api_url):
+    """Return the user's accounts for the history account filter, fetched once per session"""
+    if 'history_accounts' not in st.session_state:
+        accounts = []
+        if 'token' in st.session_state:
+            response = api_get(get_endpoint_url(api_url, "transactions", "accounts"))
+            if isinstance(response, list):
+                accounts = response
+        st.session_state.history_accounts = accounts
+    return st.session_state.history_accounts
+
+
 def render_transaction_history(api_url, token_valid):
     st.subheader("Transaction History")
 
@@ -272,9 +335,15 @@ def render_transaction_history(api_url, token_valid):
         st.session_state.selected_type = 'All'
     if 'selected_status' not in st.session_state:
         st.session_state.selected_status = 'All'
+    if 'history_filters' not in st.session_state:
+        st.session_state.history_filters = {}
     if 'filter_applied' not in st.session_state:
         st.session_state.filter_applied = False
 
+    account_options = {'All': None}
+    for account in fetch_filter_accounts(api_url):
+        account_options[f"{account['account_name']} (#{account['account_id']})"] = account['account_id']
+
     # --- Filter UI ---
     with st.form("transaction_filter_form"):
         col1, col2 = st.columns(2)
@@ -282,52 +351,81 @@ def render_transaction_history(api_url, token_valid):
             transaction_types = ['All', 'Transfer', 'Withdrawal', 'Deposit']
             selected_type = st.selectbox('Filter by Type', transaction_types, index=transaction_types.index(st.session_state.selected_type))
         with col2:
-            status_options = ['All', 'completed', 'pending', 'failed', 'cancelled']
+            status_options = ['All', 'completed', 'pending', 'failed', 'cancelled', 'expired']
             selected_status = st.selectbox('Filter by Status', status_options, index=status_options.index(st.session_state.selected_status))
+
+        with st.expander("More filters"):
+            col1, col2 = st.columns(2)
+            with col1:
+                date_from = st.date_input("From date", value=None)
+                min_amount = st.number_input("Min amount (HKD)", min_value=0.0, value=None, step=100.0)
+                selected_account = st.selectbox("Account", list(account_options.keys()))
+            with col2:
+                date_to = st.date_input("To date", value=None)
+                max_amount = st.number_input("Max amount (HKD)", min_value=0.0, value=None, step=100.0)
+                description = st.text_input("Description starts with")
         filter_button = st.form_submit_button("Apply Filter")
 
     # Update session state on filter apply
     if filter_button:
         st.session_state.selected_type = selected_type
         st.session_state.selected_status = selected_status
+        # Narrowing happens in SQL on the server, only matching rows are sent back
+        history_filters = {}
+        if date_from:
+            history_filters['date_from'] = date_from.isoformat()
+        if date_to:
+            history_filters['date_to'] = date_to.isoformat()
+        if min_amount is not None:
+            history_filters['min_amount'] = min_amount
+        if max_amount is not None:
+            history_filters['max_amount'] = max_amount
+        if account_options[selected_account] is not None:
+            history_filters['account_id'] = account_options[selected_account]
+        if description.strip():
+            history_filters['description'] = description.strip()
+        st.session_state.history_filters = history_filters
         st.session_state.filter_applied = True
 
     # Use the last applied filter for API query
-    filter_params = {}
+    filter_params = dict(st.session_state.history_filters)
     if st.session_state.selected_type != 'All':
         filter_params['transaction_type'] = st.session_state.selected_type
     if st.session_state.selected_status != 'All':
         filter_params['status'] = st.session_state.selected_status
 
-    # Demo transactions (fallback)
-    transactions = []
+    if 'history_transactions' not in st.session_state:
+        st.session_state.history_transactions = []
+    if 'history_next_cursor' not in st.session_state:
+        st.session_state.history_next_cursor = None
 
     # Only fetch when filter is applied or on first load
     if st.session_state.filter_applied or not hasattr(render_transaction_history, "has_loaded"):
         render_transaction_history.has_loaded = True  # Static attribute to control initial load
+        st.session_state.history_transactions = []
+        st.session_state.history_next_cursor = None
+        st.session_state.pop('history_export', None)
 
         # Try to get real transaction data if authenticated
         if 'token' in st.session_state:
-            transactions_url = get_endpoint_url(api_url, "transactions", "history")
-            response = api_get(transactions_url, filter_params)
-
-            if isinstance(response, dict) and 'error' in response:
-                st.error(f"Error fetching transactions: {response['error']}")
-                st.info("Showing demo transaction data.")
-            elif isinstance(response, list):
-                transactions = response
+            if fetch_history_page(api_url, filter_params):
                 st.success("Successfully loaded your transaction data")
         else:
             st.info("Using demo transaction data (please log in to see your actual transactions).")
 
         st.session_state.filter_applied = False
 
+    transactions = st.session_state.history_transactions
+
     # ---- Stylish Card Display ----
     if transactions:
         df = pd.DataFrame(transactions)
+        # The API sends amounts as exact decimal strings
+        if 'amount' in df.columns:
+            df['amount'] = pd.to_numeric(df['amount'])
+        # Rows arrive newest first from the server
         if 'transaction_date' in df.columns:
             df['transaction_date'] = pd.to_datetime(df['transaction_date'], errors='coerce')
-            df = df.sort_values(by='transaction_date', ascending=False)
 
         st.markdown("""
             <style>
@@ -378,6 +476,7 @@ def render_transaction_history(api_url, token_valid):
             .txn-status.pending {background:#fef9c3; color:#a16207;}
             .txn-status.failed {background:#fee2e2; color:#b91c1c;}
             .txn-status.cancelled {background:#e0e7ef; color:#64748b;}
+            .txn-status.expired {background:#e0e7ef; color:#64748b;}
             @media (max-width: 600px) {
                 .txn-card {flex-direction: column; align-items: flex-start;}
                 .txn-amount-pos, .txn-amount-neg {margin-top:0.6em;}
@@ -421,16 +520,39 @@ def render_transaction_history(api_url, token_valid):
             st.markdown(card_html, unsafe_allow_html=True)
 
         st.markdown('</div>', unsafe_allow_html=True)
-        # Export option
+
+        # Older pages are fetched on demand with the cursor from the last page
+        if st.session_state.history_next_cursor:
+            if st.button("Load older transactions"):
+                fetch_history_page(api_url, filter_params, before=st.session_state.history_next_cursor)
+                st.rerun()
+
+        # Export option: the server builds the file from every matching
+        # transaction, not just the pages loaded above
         with st.expander("Export Options"):
-            csv = df.to_csv(index=False)
-            filename = f"transaction_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-            st.download_button(
-                label="Download CSV",
-                data=csv,
-                file_name=filename,
-                mime="text/csv"
-            )
+            export_format = st.radio("Format", ["CSV", "Parquet"], horizontal=True)
+            if st.button("Prepare export"):
+                export_url = get_endpoint_url(api_url, "transactions", "export")
+                with st.spinner("Preparing export..."):
+                    result = api_download(export_url, dict(filter_params, format=export_format.lower()))
+                if isinstance(result, dict):
+                    st.error(f"Export failed: {result['error']}")
+                else:
+                    content, filename = result
+                    st.session_state.history_export = {
+                        'content': content,
+                        'filename': filename or f"transaction_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format.lower()}",
+                        'format': export_format,
+                    }
+
+            export = st.session_state.get('history_export')
+            if export:
+                st.download_button(
+                    label=f"Download {export['format']}",
+                    data=export['content'],
+                    file_name=export['filename'],
+                    mime="text/csv" if export['format'] == "CSV" else "application/vnd.apache.parquet"
+                )
     else:
         st.info("No transactions match the selected filters.")
 # Add this to display in sidebar if needed
@@ -120,12 +120,47 @@ def api_get(url, params=None, timeout=5):
         return {"error": str(e)}
 
 
-def api_post(url, data=None, timeout=5):
+def api_download(url, params=None, timeout=60):
+    """
+    Download a file from the API.
+
+    Returns:
+        tuple: (content bytes, filename from Content-Disposition or None),
+            or a dict with an 'error' key on failure
+    """
+    logger.info(f"GET {url} (download)")
+    try:
+        response = requests.get(url, params=params, headers=get_auth_header(), timeout=timeout, stream=True)
+        if response.status_code != 200:
+            return {"error": handle_api_error(response)}
+
+        content = b''.join(response.iter_content(chunk_size=64 * 1024))
+        filename = None
+        disposition = response.headers.get('Content-Disposition', '')
+        if 'filename=' in disposition:
+            filename = disposition.split('filename=', 1)[1].strip('"')
+        return content, filename
+    except requests.exceptions.Timeout:
+        logger.error(f"Request timed out: {url}")
+        return {"error": "Request timed out. The API server might be down or unreachable."}
+    except requests.exceptions.ConnectionError:
+        logger.error(f"Connection error: {url}")
+        return {"error": "Connection error. The API server might be down or unreachable."}
+    except Exception as e:
+        logger.error(f"Request exception: {str(e)}")
+        return {"error": str(e)}
+
+
+def api_post(url, data=None, timeout=5, idempotency_key=None):
     """Make a POST request to the API with error handling and timeout"""
     # Get token from session state
     token = st.session_state.get('token')
     headers = {"Content-Type": "application/json"}
 
+    # Lets the server recognise a retried request instead of running it twice
+    if idempotency_key:
+        headers["Idempotency-Key"] = idempotency_key
+
     # Add token to headers if it exists
     if token:
         headers["Authorization"] = f"Bearer {token}"
@@ -219,7 +254,7 @@ def test_auth_token(api_url):
 
     try:
         # Use requests directly to get more control
-        response = requests.get(test_url, headers=headers, timeout=5)
+        response = requests.get(test_url, headers=headers, params={"limit": 1}, timeout=5)
         logger.debug(f"Token test response status: {response.status_code}")
 
         if response.status_code == 200: